@@ -0,0 +1,129 @@
+"""
+Async variants of the hot public read endpoints, routed in place of the DRF
+views when the app is served over ASGI (see backend/asgi.py and
+ASYNC_API_VIEWS in api/urls.py).
+
+They return the same JSON as their counterparts in api.views and share their
+response cache through api.cache.acached_response, so a cache hit never
+leaves the event loop. Misses load rows with the async ORM; keyset pages and
+search ranking run their SQL through sync_to_async, as the async ORM does
+internally. Anything but GET is handed to the sync DRF view.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from .cache import acached_response, category_scope, post_scope
+from .models import Category, Post
+from .pagination import CreatedAtCursorPagination, SearchCursorPagination
+from .search import PostSearch
+from .serializers import (
+    CategoryDetailSerializer,
+    PostSerializer,
+    for_post_list,
+    post_comments,
+    post_list_context,
+    preload_commenters,
+)
+from .views import CategoryDetailView, PostDetailView, PostSearchView, RecentPostListView
+
+
+def reads(sync_view):
+    """Serve GET with the decorated coroutine and other methods with `sync_view`."""
+    sync_view = sync_to_async(sync_view)
+
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def dispatch(request, *args, **kwargs):
+            if request.method != "GET":
+                return await sync_view(request, *args, **kwargs)
+            try:
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                return JsonResponse({"detail": exc.detail}, status=exc.status_code)
+
+        return dispatch
+
+    return decorator
+
+
+def list_context(request):
+    # Serializer context matching api.views.PostListMixin
+    request = Request(request)
+    return {"request": request, **post_list_context(request)}
+
+
+def not_found(model):
+    return {"detail": f"No {model._meta.object_name} matches the given query."}, 404
+
+
+async def preload_post_commenters(context, posts):
+    # Serializers resolve commenters lazily, which the event loop can't do
+    comments = [comment for post in posts for comment in post_comments(post)]
+    await sync_to_async(preload_commenters)(context, comments)
+
+
+@reads(PostDetailView.as_view())
+async def post_detail(request, slug):
+    async def render():
+        post = await Post.objects.with_related().with_related_posts().filter(slug=slug).afirst()
+        if post is None:
+            return not_found(Post)
+        context = {"request": Request(request)}
+        await preload_post_commenters(context, [post])
+        return PostSerializer(post, context=context).data, 200
+
+    return await acached_response(request, post_scope(slug), render)
+
+
+@reads(RecentPostListView.as_view())
+async def recent_posts(request):
+    async def render():
+        context = list_context(request)
+        posts = for_post_list(Post.objects.all(), context).order_by("-created_at")[:6]
+        posts = [post async for post in posts]
+        if "comments" in context["expand"]:
+            await preload_post_commenters(context, posts)
+        return PostSerializer(posts, many=True, context=context).data, 200
+
+    return await acached_response(request, "recent-posts", render)
+
+
+@reads(PostSearchView.as_view())
+async def post_search(request):
+    context = list_context(request)
+    posts = for_post_list(Post.objects.all(), context)
+    search = PostSearch(context["request"].query_params.get("q", ""), posts)
+    paginator = SearchCursorPagination()
+    page = await sync_to_async(paginator.paginate_queryset)(search, context["request"])
+    if "comments" in context["expand"]:
+        await preload_post_commenters(context, page)
+    data = PostSerializer(page, many=True, context=context).data
+    return JsonResponse(paginator.get_paginated_response(data).data)
+
+
+@reads(CategoryDetailView.as_view())
+async def category_detail(request, name):
+    async def render():
+        category = await Category.objects.filter(name=name).afirst()
+        if category is None:
+            return not_found(Category)
+        context = list_context(request)
+        paginator = CreatedAtCursorPagination()
+        context["posts"] = await sync_to_async(paginator.paginate_queryset)(
+            for_post_list(category.posts.all(), context), context["request"]
+        )
+        if "comments" in context["expand"]:
+            await preload_post_commenters(context, context["posts"])
+        data = CategoryDetailSerializer(category, context=context).data
+        data["next"] = paginator.get_next_link()
+        data["previous"] = paginator.get_previous_link()
+        return data, 200
+
+    return await acached_response(request, category_scope(name), render)
@@ -0,0 +1,98 @@
+"""
+Stateless JWT authentication.
+
+LoginTokenSerializer signs the user's id, username and is_active into the
+tokens, along with auth_time, the time of the login they descend from.
+ClaimsJWTAuthentication builds request.user from those claims instead of
+loading the User row: the instance has only those fields loaded, and any
+other field is fetched on first access (Django deferred fields), so views
+that just filter by the user never query it.
+
+Tokens are revoked per user: revoke_tokens() is called from api.signals when
+a user changes password or username, is deactivated or is deleted, and any
+token whose auth_time is not after the revocation is refused, refresh tokens
+included. Revocations are stored in the database (TokenRevocation), read
+from the primary, and kept for as long as a refresh token lives; each
+process remembers what it read for AUTH_REVOCATION_TTL seconds, which bounds
+how long a revoked token keeps working elsewhere.
+
+Tokens issued before these claims existed are authenticated against the
+database as before.
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import router
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import TokenRevocation
+
+CLAIMS = ("auth_time", "username", "is_active")
+
+# Local revocation lookups, user id -> (expires, revoked at or None)
+_revocations = {}
+MAX_LOCAL_REVOCATIONS = 10000
+
+
+def revoked_at(user_id):
+    now = time.monotonic()
+    entry = _revocations.get(user_id)
+    if entry is None or entry[0] < now:
+        if len(_revocations) >= MAX_LOCAL_REVOCATIONS:
+            _revocations.clear()
+        # From the primary: a replica may not have the revocation yet
+        revoked = (
+            TokenRevocation.objects.using(router.db_for_write(TokenRevocation))
+            .filter(user_id=user_id)
+            .values_list("revoked_at", flat=True)
+            .first()
+        )
+        entry = (now + settings.AUTH_REVOCATION_TTL, revoked)
+        _revocations[user_id] = entry
+    return entry[1]
+
+
+def revoke_tokens(user_id):
+    """Refuse every token issued to the user so far."""
+    now = time.time()
+    TokenRevocation.objects.update_or_create(user_id=user_id, defaults={"revoked_at": now})
+    # Every token older revocations refused has expired
+    lifetime = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+    TokenRevocation.objects.filter(revoked_at__lt=now - lifetime).delete()
+    _revocations.pop(user_id, None)
+
+
+def check_revocation(token):
+    revoked = revoked_at(token[api_settings.USER_ID_CLAIM])
+    if revoked is not None and token["auth_time"] <= revoked:
+        raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+
+
+def add_claims(token, user):
+    token["username"] = user.username
+    token["is_active"] = user.is_active
+    token["auth_time"] = time.time()
+    return token
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if not all(claim in validated_token for claim in CLAIMS):
+            return super().get_user(validated_token)
+
+        check_revocation(validated_token)
+        if not validated_token["is_active"]:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return User.from_db(
+            router.db_for_read(User),
+            ["id", "username", "is_active"],
+            [
+                validated_token[api_settings.USER_ID_CLAIM],
+                validated_token["username"],
+                validated_token["is_active"],
+            ],
+        )
@@ -0,0 +1,49 @@
+"""
+Work run after the commit, on background threads.
+
+run_after_commit() runs a function once the current transaction commits, on
+a thread pool of its own for each name: the renditions of api.images and the
+related posts of api.related don't wait for each other. Pools are created on
+first use with the given number of workers; 0 or less runs the function at
+the commit, in the request's thread.
+
+Exceptions are logged to the "api.background" logger, and worker threads
+close their database connections when done.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def executor(name, workers):
+    with _lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        return _executors[name]
+
+
+def _run(fn, *args):
+    try:
+        fn(*args)
+    except Exception:
+        logger.exception("%s%r failed", fn.__qualname__, args)
+    finally:
+        # Worker threads get their own connections; don't leave them open
+        connections.close_all()
+
+
+def run_after_commit(name, workers, fn, *args):
+    """Run fn(*args) on the `name` pool of `workers` threads after the commit."""
+    if workers <= 0:
+        transaction.on_commit(lambda: fn(*args))
+        return
+    pool = executor(name, workers)
+    transaction.on_commit(lambda: pool.submit(_run, fn, *args))
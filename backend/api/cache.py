@@ -0,0 +1,183 @@
+"""
+Response cache for the public read endpoints.
+
+Each cached endpoint serves one or more scopes: "recent-posts",
+"categories", "post:<slug>", "category:<name>" and "user:<username>". A scope
+has a version, the time it was last invalidated; responses are cached under
+the scope version plus the request URL, so bumping the version drops every
+cached page and query-string variant at once. Writes bump the versions they
+affect from the signal handlers in api.signals, once the write commits. Changes that show up
+everywhere (category names, profile photos) bump the "all" scope instead of
+tracking down every page that embeds them.
+
+Cached responses carry an ETag and a Last-Modified header (the scope
+version), so clients revalidating with If-None-Match / If-Modified-Since get
+a 304 without the response being rebuilt.
+
+Pages read from a database replica shortly after their scope changed are
+not stored, see api.replicas.
+
+The backend is Django's default cache: in-process locmem unless REDIS_URL is
+set, see CACHES in settings.
+"""
+
+import hashlib
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .replicas import current_replica
+
+GLOBAL_SCOPE = "all"
+
+
+def version_key(scope):
+    return f"api:version:{scope}"
+
+
+def get_versions(scopes):
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in versions}
+    if missing:
+        # First use, or the version was evicted: start a fresh one
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*scopes):
+    now = time.time()
+    cache.set_many({version_key(scope): now for scope in scopes}, timeout=None)
+
+
+def invalidate_on_commit(*scopes):
+    """
+    invalidate() once the current transaction commits: bumped any earlier, a
+    concurrent read could cache the rows from before the write under the new
+    version.
+    """
+    transaction.on_commit(lambda: invalidate(*scopes))
+
+
+def post_scope(slug):
+    return f"post:{slug}"
+
+
+def category_scope(name):
+    return f"category:{name.lower()}"
+
+
+def user_scope(username):
+    return f"user:{username.lower()}"
+
+
+def response_key(request, scope, versions, per_user):
+    variant = request.build_absolute_uri()
+    if per_user:
+        variant += f"|user:{request.user.pk}"
+    return "api:response:" + hashlib.md5(
+        f"{scope}|{versions}|{variant}".encode()
+    ).hexdigest()
+
+
+def make_entry(data, versions):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return {
+        "data": data,
+        "etag": '"%s"' % hashlib.md5(body.encode()).hexdigest(),
+        "last_modified": int(max(versions)),
+    }
+
+
+def entry_response(request, entry, response, per_user):
+    response["ETag"] = entry["etag"]
+    response["Last-Modified"] = http_date(entry["last_modified"])
+    # Clients may keep the response but must revalidate it
+    response["Cache-Control"] = "no-cache"
+    if per_user:
+        patch_vary_headers(response, ["Authorization"])
+    return get_conditional_response(
+        request,
+        etag=entry["etag"],
+        last_modified=entry["last_modified"],
+        response=response,
+    )
+
+
+def storable(versions):
+    # A replica may not have caught up with the last change to the scope yet
+    return (
+        current_replica() is None
+        or time.time() - max(versions) >= settings.DATABASE_REPLICA_LAG
+    )
+
+
+def lookup(request, scope, per_user):
+    # The scope versions, response key and cached entry (or None) for request
+    versions = get_versions([scope, GLOBAL_SCOPE])
+    key = response_key(request, scope, versions, per_user)
+    return versions, key, cache.get(key)
+
+
+def cached_response(request, scope, render, per_user=False):
+    """
+    Return the cached response for `scope` and this request, building it with
+    `render()` on a miss. Only 200 responses are cached.
+    """
+    versions, key, entry = lookup(request, scope, per_user)
+    if entry is None:
+        response = render()
+        if response.status_code != 200:
+            return response
+        entry = make_entry(response.data, versions)
+        if storable(versions):
+            cache.set(key, entry, timeout=settings.API_CACHE_TIMEOUT)
+
+    return entry_response(request, entry, Response(entry["data"]), per_user)
+
+
+async def acached_response(request, scope, render):
+    """
+    cached_response() for the async views in api.async_views: `render` is a
+    coroutine function returning (data, status). Entries are shared with the
+    sync views.
+    """
+    # Django's cache backends are sync, each async call is a thread hop, so
+    # look everything up in a single one
+    versions, key, entry = await sync_to_async(lookup)(request, scope, False)
+    if entry is None:
+        data, status = await render()
+        if status != 200:
+            return JsonResponse(data, status=status)
+        entry = make_entry(data, versions)
+        if storable(versions):
+            await cache.aset(key, entry, timeout=settings.API_CACHE_TIMEOUT)
+
+    return entry_response(request, entry, JsonResponse(entry["data"], safe=False), False)
+
+
+class CachedGetMixin:
+    """Serve GET through cached_response(); views define cache_scope()."""
+
+    cache_per_user = False
+
+    def cache_scope(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        return cached_response(
+            request,
+            self.cache_scope(),
+            lambda: super(CachedGetMixin, self).get(request, *args, **kwargs),
+            per_user=self.cache_per_user,
+        )
@@ -0,0 +1,144 @@
+"""
+Buffered comment inserts, for absorbing bursts of comments.
+
+With settings.COMMENT_BUFFER_SIZE above 0, CommentListCreateView validates
+each new comment as usual and then queues it here instead of saving it,
+answering 202 Accepted with the comment as it will be stored (without an id
+yet). The request that fills the buffer writes the whole batch with one
+bulk_create; a background thread writes whatever is left every
+COMMENT_BUFFER_INTERVAL seconds so quiet periods don't leave comments
+waiting.
+
+bulk_create doesn't send post_save, so flush() does the work of the
+api.signals handlers for the batch at once: one counter UPDATE per post and
+per author, and one cache invalidation for every page affected.
+
+The comments were already answered with 202, so a flush never raises into
+the request that triggered it. Comments on posts deleted since they were
+queued are dropped and logged; if the write fails, the batch goes back in
+the queue for the next flush, up to MAX_ATTEMPTS times, after which its
+comments are logged and dropped.
+
+Comments still queued when a process is killed are lost (a normal exit
+flushes them), so only turn this on where that is acceptable.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+from .cache import invalidate
+from .counters import add_comments
+from .models import Comment, Post
+from .signals import post_scopes
+
+logger = logging.getLogger(__name__)
+
+# Writes of a comment tried before it is given up on
+MAX_ATTEMPTS = 3
+
+_lock = threading.Lock()
+_pending = []
+_timer = None
+
+
+def enabled():
+    return settings.COMMENT_BUFFER_SIZE > 0
+
+
+def enqueue(comment):
+    """Queue an unsaved Comment, writing the batch if this fills it."""
+    comment.created_at = timezone.now()
+    with _lock:
+        _pending.append(comment)
+        full = len(_pending) >= settings.COMMENT_BUFFER_SIZE
+    if full:
+        flush()
+    else:
+        start_timer()
+
+
+def flush():
+    """Write every queued comment; returns how many were written."""
+    with _lock:
+        batch = _pending[:]
+        del _pending[:]
+    if not batch:
+        return 0
+
+    try:
+        batch = drop_orphans(batch)
+        with transaction.atomic():
+            Comment.objects.bulk_create(batch)
+            add_comments(batch)
+    except DatabaseError:
+        requeue(batch)
+        return 0
+
+    posts = {comment.post_id: comment.post for comment in batch}
+    invalidate(*post_scopes(*posts.values()))
+    return len(batch)
+
+
+def drop_orphans(batch):
+    # Comments on posts deleted since they were queued would fail the batch
+    post_ids = set(
+        Post.objects.filter(pk__in={comment.post_id for comment in batch}).values_list(
+            "pk", flat=True
+        )
+    )
+    orphans = [comment for comment in batch if comment.post_id not in post_ids]
+    for comment in orphans:
+        logger.warning(
+            "Dropped a buffered comment by %s on deleted post %s", comment.email, comment.post_id
+        )
+    return [comment for comment in batch if comment.post_id in post_ids]
+
+
+def requeue(batch):
+    logger.exception("Writing %d buffered comments failed", len(batch))
+    retry = []
+    for comment in batch:
+        comment._attempts = getattr(comment, "_attempts", 0) + 1
+        if comment._attempts < MAX_ATTEMPTS:
+            retry.append(comment)
+        else:
+            logger.error(
+                "Gave up on a buffered comment by %s on post %s: %r",
+                comment.email,
+                comment.post_id,
+                comment.content,
+            )
+    with _lock:
+        # Ahead of what was queued since, to keep the order
+        _pending[:0] = retry
+
+
+def start_timer():
+    global _timer
+    if _timer is not None or not settings.COMMENT_BUFFER_INTERVAL:
+        return
+    with _lock:
+        if _timer is None:
+            _timer = threading.Thread(target=_run, name="comment-buffer", daemon=True)
+            _timer.start()
+
+
+def _run():
+    while True:
+        time.sleep(settings.COMMENT_BUFFER_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            logger.exception("Writing buffered comments failed")
+        finally:
+            # This thread has its own connection; honour CONN_MAX_AGE for it
+            close_old_connections()
+
+
+atexit.register(flush)
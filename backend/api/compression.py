@@ -0,0 +1,123 @@
+"""
+Compressed JSON responses.
+
+CompressionMiddleware compresses JSON responses of at least MIN_LENGTH bytes
+for clients that accept it: brotli when the brotli package is installed and
+the client sends "br", gzip otherwise. Streamed bodies are compressed as they
+are written. The ETag is weakened, since the bytes differ from the
+uncompressed representation, and Vary: Accept-Encoding lets browsers and CDNs
+keep each variant.
+
+Responses with an ETag are the same for everyone who gets that ETag (the
+cached endpoints, see api.cache), so their compressed bodies are kept in the
+default cache, keyed by a hash of the uncompressed body: each is compressed
+once, not on every hit.
+
+Only JSON is compressed. HTML pages carry CSRF tokens that compression would
+expose to BREACH-style attacks, media is compressed already, and byte ranges
+(api.media) address the stored bytes.
+"""
+
+import gzip
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_LENGTH = 200
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+
+COMPRESSIBLE_TYPES = {"application/json"}
+ACCEPT_ENCODING_RE = re.compile(r"([\w*-]+)\s*(?:;\s*q=([\d.]+))?")
+
+
+def accepted_encoding(request):
+    """The encoding to use for the request, or None."""
+    accepted = {}
+    for coding, quality in ACCEPT_ENCODING_RE.findall(request.headers.get("Accept-Encoding", "")):
+        try:
+            accepted[coding.lower()] = float(quality or 1)
+        except ValueError:
+            continue
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(content, encoding):
+    if encoding == "br":
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    if encoding == "gzip":
+        yield from compress_sequence(chunks)
+        return
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for chunk in chunks:
+        if data := compressor.process(chunk):
+            yield data
+    yield compressor.finish()
+
+
+def precompressed(content, encoding):
+    key = f"api:compressed:{encoding}:{hashlib.md5(content).hexdigest()}"
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = compress(content, encoding)
+        cache.set(key, compressed, timeout=settings.API_CACHE_TIMEOUT)
+    return compressed
+
+
+def compressible(response):
+    content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+    return (
+        content_type in COMPRESSIBLE_TYPES
+        and response.status_code != 206
+        and not response.has_header("Content-Encoding")
+        and not (response.streaming and response.is_async)
+        and (response.streaming or len(response.content) >= MIN_LENGTH)
+    )
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if not compressible(response):
+            return response
+        patch_vary_headers(response, ["Accept-Encoding"])
+        encoding = accepted_encoding(request)
+        if encoding is None:
+            return response
+
+        etag = response.get("ETag")
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response.headers["Content-Length"]
+        else:
+            if etag:
+                content = precompressed(response.content, encoding)
+            else:
+                content = compress(response.content, encoding)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers["Content-Length"] = str(len(content))
+
+        # RFC 9110 8.8.1: another encoding is another representation
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,101 @@
+"""
+Denormalized counters behind DashboardView.
+
+Post.comment_count, UserProfile.post_count/comment_count and
+Category.post_count/last_post_at (for the category list) are kept current by
+the signal handlers in api.signals, inside the same transaction as the
+write that changes them. rebuild_counters() recomputes them from scratch and
+backs the `manage.py rebuild_counters` command.
+
+received_comment_count() is the total of comments on a user's posts, shared
+by the comment list and the dashboard.
+"""
+
+from collections import Counter
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, field):
+    # Correlated COUNT(*) grouped on `field`, 0 when there are no rows
+    counts = queryset.values(field).annotate(total=Count("pk")).values("total")
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def latest_post_at(Post):
+    # Correlated lookup of a category's newest post on the category index
+    latest = Post.objects.filter(category=OuterRef("pk")).order_by("-created_at")
+    return Subquery(latest.values("created_at")[:1])
+
+
+def rebuild_counters():
+    from .models import Category, Comment, Post, UserProfile
+
+    Post.objects.update(
+        comment_count=count_of(Comment.objects.filter(post=OuterRef("pk")), "post")
+    )
+    UserProfile.objects.update(
+        post_count=count_of(Post.objects.filter(author=OuterRef("user")), "author"),
+        comment_count=count_of(
+            Comment.objects.filter(post__author=OuterRef("user")), "post__author"
+        ),
+    )
+    Category.objects.update(
+        post_count=count_of(Post.objects.filter(category=OuterRef("pk")), "category"),
+        last_post_at=latest_post_at(Post),
+    )
+
+
+def received_comment_count(user, profile=None):
+    """
+    The number of comments on `user`'s posts, from their profile's counter;
+    counted with a join for users without a profile.
+    """
+    from .models import Comment, UserProfile
+
+    if profile is None:
+        profile = UserProfile.objects.filter(user=user.pk).only("comment_count").first()
+    if profile is not None:
+        return profile.comment_count
+    return Comment.objects.on_posts_of(user).count()
+
+
+def add_comment(comment, delta=1):
+    from .models import Post, UserProfile
+
+    Post.objects.filter(pk=comment.post_id).update(
+        comment_count=F("comment_count") + delta
+    )
+    UserProfile.objects.filter(user__posts=comment.post_id).update(
+        comment_count=F("comment_count") + delta
+    )
+
+
+def add_comments(comments):
+    # add_comment() for a batch: one UPDATE per post and per post author
+    from .models import Post, UserProfile
+
+    for post_id, count in Counter(comment.post_id for comment in comments).items():
+        Post.objects.filter(pk=post_id).update(comment_count=F("comment_count") + count)
+    authors = Counter(comment.post.author_id for comment in comments)
+    for author_id, count in authors.items():
+        UserProfile.objects.filter(user=author_id).update(
+            comment_count=F("comment_count") + count
+        )
+
+
+def add_post(post, delta=1):
+    from .models import UserProfile
+
+    UserProfile.objects.filter(user=post.author_id).update(
+        post_count=F("post_count") + delta
+    )
+
+
+def add_category_post(category_id, delta=1):
+    from .models import Category, Post
+
+    Category.objects.filter(pk=category_id).update(
+        post_count=F("post_count") + delta, last_post_at=latest_post_at(Post)
+    )
@@ -0,0 +1,143 @@
+"""
+Resized renditions of uploaded post images and profile photos.
+
+Originals are stored as uploaded. Once the upload is committed, a background
+thread pool renders every RENDITIONS size as WebP and JPEG, with EXIF and
+other metadata stripped, to
+
+    MEDIA_ROOT/renditions/<original path without extension>/<size>.<hash>.<format>
+
+The paths derive from the original's name and, like every media file (see
+api.media), the hash of their bytes, so rendering again yields the same files.
+When done, the worker records the paths in the model's `<field>_renditions`
+JSON field together with the original's name, so a newer upload is never
+served the renditions of the previous one. Serializers expose them with
+rendition_urls(), which returns None until they are ready; clients fall back
+to the original meanwhile.
+
+settings.IMAGE_WORKERS sets the pool size; 0 renders inline. Run
+`manage.py generate_renditions` for images uploaded before this existed.
+"""
+
+import logging
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .background import run_after_commit
+from .cache import invalidate
+
+logger = logging.getLogger(__name__)
+
+# Bounding boxes; images are only ever scaled down, keeping their aspect ratio
+RENDITIONS = {
+    "thumbnail": (200, 200),
+    "card": (640, 640),
+    "full": (1600, 1600),
+}
+
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def rendition_path(name, size, extension):
+    return posixpath.join("renditions", posixpath.splitext(name)[0], f"{size}.{extension}")
+
+
+def clean_image(source):
+    # Apply the EXIF orientation, then drop EXIF, ICC and the other metadata
+    image = ImageOps.exif_transpose(Image.open(source))
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+    image.info = {}
+    return image
+
+
+def render(name):
+    """
+    Render every size and format of the stored image `name`; return the
+    `<field>_renditions` value recording them.
+    """
+    with default_storage.open(name) as source:
+        image = clean_image(source)
+
+    renditions = {"source": name}
+    for size, box in RENDITIONS.items():
+        resized = image.copy()
+        resized.thumbnail(box, Image.Resampling.LANCZOS)
+        renditions[size] = {}
+        for extension, (image_format, options) in FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, image_format, **options)
+            renditions[size][extension] = default_storage.save(
+                rendition_path(name, size, extension), ContentFile(buffer.getvalue())
+            )
+    return renditions
+
+
+def generate_renditions(model, pk, field, scopes=()):
+    """
+    Render `field` of the `model` row `pk` and record the result, unless the
+    image was replaced or removed in the meantime. `scopes` are the cached
+    responses (api.cache) to drop once the renditions are available.
+    """
+    name = model.objects.filter(pk=pk).values_list(field, flat=True).first()
+    if not name:
+        return
+    try:
+        renditions = render(name)
+    except Exception:
+        logger.exception("Could not render %s", name)
+        return
+    updated = model.objects.filter(pk=pk, **{field: name}).update(
+        **{f"{field}_renditions": renditions}
+    )
+    if updated and scopes:
+        invalidate(*scopes)
+
+
+def needs_renditions(instance, field):
+    image = getattr(instance, field)
+    renditions = getattr(instance, f"{field}_renditions") or {}
+    return bool(image) and renditions.get("source") != image.name
+
+
+def schedule_renditions(instance, field, scopes=()):
+    """Render `field` of `instance` in the background after the commit."""
+    run_after_commit(
+        "renditions",
+        settings.IMAGE_WORKERS,
+        generate_renditions,
+        type(instance),
+        instance.pk,
+        field,
+        tuple(scopes),
+    )
+
+
+def rendition_urls(instance, field, request=None):
+    """
+    The {size: {format: url}} renditions of `field` on `instance`, or None if
+    there is no image or its renditions are not ready yet.
+    """
+    if not getattr(instance, field) or needs_renditions(instance, field):
+        return None
+    renditions = getattr(instance, f"{field}_renditions")
+    urls = {}
+    for size in RENDITIONS:
+        urls[size] = {}
+        for extension, path in renditions.get(size, {}).items():
+            url = default_storage.url(path)
+            urls[size][extension] = request.build_absolute_uri(url) if request else url
+    return urls
@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Max, OuterRef, Subquery
+
+from api.models import Comment
+
+
+class Command(BaseCommand):
+    help = "Link comments to the registered user with the same email"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Comments updated per statement (by id range)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        user_id = Subquery(
+            User.objects.filter(email=OuterRef("email")).order_by("pk").values("pk")[:1]
+        )
+        last_id = Comment.objects.aggregate(last=Max("pk"))["last"] or 0
+        linked = 0
+        # Short id-range batches keep each UPDATE's locks brief
+        for start in range(0, last_id, batch_size):
+            linked += Comment.objects.filter(
+                pk__gt=start,
+                pk__lte=start + batch_size,
+                user__isnull=True,
+                email__in=User.objects.values("email"),
+            ).update(user=user_id)
+        self.stdout.write(self.style.SUCCESS(f"Linked {linked} comments"))
@@ -0,0 +1,38 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.transfer import export_rows
+
+
+class Command(BaseCommand):
+    help = "Write categories, posts and comments as JSON Lines (see api.transfer)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-", help="Output file, - for stdout")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        out = (
+            self.stdout
+            if options["path"] == "-"
+            else open(options["path"], "w", encoding="utf-8")
+        )
+        # Full precision timestamps, DjangoJSONEncoder stops at milliseconds
+        encoder = json.JSONEncoder(ensure_ascii=False, default=lambda value: value.isoformat())
+        started = time.perf_counter()
+        written = 0
+        try:
+            for row in export_rows(options["chunk_size"]):
+                out.write(encoder.encode(row) + "\n")
+                written += 1
+        finally:
+            if out is not self.stdout:
+                out.close()
+        elapsed = time.perf_counter() - started
+        self.stderr.write(
+            self.style.SUCCESS(
+                f"Exported {written} rows in {elapsed:.1f}s ({written / max(elapsed, 1e-9):.0f} rows/s)"
+            )
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import GLOBAL_SCOPE, invalidate
+from api.images import generate_renditions, needs_renditions
+from api.models import Post, UserProfile
+
+
+class Command(BaseCommand):
+    help = "Render resized copies of post images and profile photos that lack them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true", help="Render every image again"
+        )
+
+    def handle(self, *args, **options):
+        rendered = 0
+        for model, field in ((Post, "image"), (UserProfile, "photo")):
+            rows = model.objects.exclude(**{field: ""}).exclude(**{field: None})
+            for instance in rows.only("pk", field, f"{field}_renditions").iterator():
+                if options["force"] or needs_renditions(instance, field):
+                    generate_renditions(model, instance.pk, field)
+                    rendered += 1
+        if rendered:
+            invalidate(GLOBAL_SCOPE)
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} images"))
@@ -0,0 +1,47 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.transfer import Importer
+
+
+class Command(BaseCommand):
+    help = "Load categories, posts and comments written by export_content"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-", help="Input file, - for stdin")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        source = (
+            sys.stdin
+            if options["path"] == "-"
+            else open(options["path"], encoding="utf-8")
+        )
+        importer = Importer(batch_size=options["batch_size"])
+        started = time.perf_counter()
+        try:
+            for number, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    importer.add(json.loads(line))
+                except json.JSONDecodeError as error:
+                    raise CommandError(f"Line {number}: {error}")
+                if number % 10000 == 0:
+                    self.stderr.write(f"{number} lines read")
+            counts = importer.finish()
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        elapsed = time.perf_counter() - started
+        imported = counts["category"] + counts["post"] + counts["comment"]
+        self.stderr.write(
+            self.style.SUCCESS(
+                f"Imported {counts['category']} categories, {counts['post']} posts and "
+                f"{counts['comment']} comments, skipped {counts['skipped']} rows, "
+                f"in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} rows/s)"
+            )
+        )
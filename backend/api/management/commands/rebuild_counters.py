@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute post, user and category counters from the source tables"
+
+    def handle(self, *args, **options):
+        rebuild_counters()
+        self.stdout.write(self.style.SUCCESS("Counters rebuilt"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.related import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the related posts of every post, see api.related"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = rebuild(options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Related posts of {count} posts rebuilt"))
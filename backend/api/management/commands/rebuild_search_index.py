@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the post search index from the posts table"
+
+    def handle(self, *args, **options):
+        get_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
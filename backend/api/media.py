@@ -0,0 +1,162 @@
+"""
+Media files under content-hashed names, served for browsers and CDNs.
+
+HashedMediaStorage, the default storage, saves every file under a name
+carrying a hash of its bytes:
+
+    post_images/photo.jpg  ->  post_images/photo.3f2a9c1b7e4d.jpg
+
+A name therefore never changes content: a new upload gets a new name, and
+saving the same bytes again reuses the stored file. Rendered renditions
+(api.images) are saved the same way.
+
+serve_media() serves MEDIA_ROOT at MEDIA_URL when settings.SERVE_MEDIA is on.
+Hashed names are sent with a Cache-Control of MEDIA_CACHE_MAX_AGE and
+"immutable", so browsers and CDNs never revalidate them; other names (files
+uploaded before this existed) must be revalidated. Every response carries an
+ETag and Last-Modified, so revalidation gets a 304, and single byte ranges
+are answered with a 206, so video players and resumed downloads read only
+what they need. MEDIA_URL may point at a CDN pulling from this server.
+"""
+
+import hashlib
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+HASH_LENGTH = 12
+HASHED_NAME_RE = re.compile(rf"\.[0-9a-f]{{{HASH_LENGTH}}}(\.[^./]+)?$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+CHUNK_SIZE = 64 * 1024
+
+
+def hashed_name(name, content):
+    digest = hashlib.md5(usedforsecurity=False)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    root, extension = posixpath.splitext(name)
+    return f"{root}.{digest.hexdigest()[:HASH_LENGTH]}{extension}"
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME_RE.search(name))
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """FileSystemStorage saving files under content-hashed names."""
+
+    def get_available_name(self, name, max_length=None):
+        # Leave room for the hash
+        if max_length is not None:
+            max_length -= HASH_LENGTH + 1
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        name = hashed_name(name, content)
+        if self.exists(name):
+            # Same name, same bytes
+            return name
+        return super()._save(name, content)
+
+
+def cache_control(name):
+    if is_hashed(name):
+        return f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable"
+    return "public, no-cache"
+
+
+def byte_range(request, size, etag, last_modified):
+    """
+    The (start, end) byte range, end exclusive, the request asks for; None
+    for the whole file. Multiple ranges and malformed headers get the whole
+    file too. Raises ValueError if the range starts past the end.
+    """
+    header = request.headers.get("Range")
+    if not header or not (match := RANGE_RE.match(header.strip())):
+        return None
+    # If-Range: only the range of the version the client already has
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        return None
+
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # The last N bytes
+        if not int(last) or not size:
+            raise ValueError
+        return max(size - int(last), 0), size
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError
+    return start, min(int(last) + 1, size) if last else size
+
+
+def read_range(path, start, end):
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = Path(default_storage.path(path))
+    except SuspiciousFileOperation:
+        raise Http404
+    if not full_path.is_file():
+        raise Http404
+
+    stat = full_path.stat()
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    last_modified = int(stat.st_mtime)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+        "Cache-Control": cache_control(path),
+        "Accept-Ranges": "bytes",
+    }
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        try:
+            span = byte_range(request, stat.st_size, etag, last_modified)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+            return response
+        if span is None:
+            response = FileResponse(full_path.open("rb"))
+        else:
+            start, end = span
+            content_type, encoding = mimetypes.guess_type(full_path.name)
+            response = StreamingHttpResponse(
+                read_range(full_path, start, end),
+                status=206,
+                content_type=content_type or "application/octet-stream",
+            )
+            response["Content-Length"] = end - start
+            response["Content-Range"] = f"bytes {start}-{end - 1}/{stat.st_size}"
+    for header, value in headers.items():
+        response[header] = value
+    return response
@@ -0,0 +1,40 @@
+"""
+Category membership (Category.users): which categories a user may post in.
+
+Each user's accessible category ids are loaded with one indexed scan of the
+membership table and cached as a set, so access checks don't touch the
+database however many members a category has. The api.signals m2m_changed
+handler drops a user's set once a change adding them to or removing them
+from a category commits; the cache timeout bounds anything that bypasses
+the signal.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category
+
+Membership = Category.users.through
+
+
+def access_key(user_id):
+    return f"api:category-access:{user_id}"
+
+
+def accessible_category_ids(user):
+    key = access_key(user.pk)
+    category_ids = cache.get(key)
+    if category_ids is None:
+        category_ids = frozenset(
+            Membership.objects.filter(user_id=user.pk).values_list("category_id", flat=True)
+        )
+        cache.set(key, category_ids, timeout=settings.API_CACHE_TIMEOUT)
+    return category_ids
+
+
+def has_access(user, category):
+    return user.is_authenticated and category.pk in accessible_category_ids(user)
+
+
+def forget_access(user_ids):
+    cache.delete_many([access_key(user_id) for user_id in user_ids])
@@ -0,0 +1,301 @@
+"""
+Per-request instrumentation: SQL, serialization and response size.
+
+MetricsMiddleware measures every request:
+
+- the number of SQL queries and the time spent in them, on every database
+  alias, including queries async views run in worker threads
+- the time spent building serializer output (top-level `.data` of the
+  serializers using TimedDataMixin, and of their list serializers; nested
+  serializers count towards their parent)
+- the response size and the total time, up to the end of streamed bodies
+
+and reports them
+
+- to the client, as a Server-Timing header (db, serialize, total) when
+  settings.SERVER_TIMING is on
+- to Prometheus, aggregated per URL pattern at /metrics: request counts by
+  status, duration and queries-per-request histograms, and DB time,
+  serialization time and response bytes totals
+- to the "api.metrics" logger, with the request's SQL statements, for
+  requests slower than settings.SLOW_REQUEST_MS
+
+The aggregates live in process memory, so each worker reports its own; sum
+them across instances in Prometheus. /metrics requires "Authorization:
+Bearer <METRICS_TOKEN>" and is not served at all while METRICS_TOKEN is unset.
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from rest_framework.serializers import ListSerializer
+
+logger = logging.getLogger(__name__)
+
+# Statements kept per request for the slow request log
+MAX_LOGGED_QUERIES = 50
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serializing = False
+        self.statements = []
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if len(self.statements) < MAX_LOGGED_QUERIES:
+            self.statements.append((duration, sql))
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - started)
+
+
+def instrument_connection(sender, connection, **kwargs):
+    # Wrappers stay on the connection object across reconnects
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(instrument_connection)
+
+
+def timed(build):
+    """Call build(), counting it towards the request's serialization time."""
+    metrics = _current.get()
+    if metrics is None or metrics.serializing:
+        return build()
+    metrics.serializing = True
+    started = time.perf_counter()
+    try:
+        return build()
+    finally:
+        metrics.serialize_time += time.perf_counter() - started
+        metrics.serializing = False
+
+
+class TimedDataMixin:
+    """For the api serializers: time building their `.data`."""
+
+    @property
+    def data(self):
+        return timed(lambda: super(TimedDataMixin, self).data)
+
+
+class TimedListSerializer(TimedDataMixin, ListSerializer):
+    pass
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.requests = defaultdict(int)  # (view, method, status) -> count
+        self.durations = defaultdict(lambda: Histogram(DURATION_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+        self.db_time = defaultdict(float)
+        self.serialize_time = defaultdict(float)
+        self.response_bytes = defaultdict(int)
+
+    def observe(self, view, method, status, metrics, duration, size):
+        with self.lock:
+            self.requests[view, method, status] += 1
+            self.durations[view].observe(duration)
+            self.queries[view].observe(metrics.queries)
+            self.db_time[view] += metrics.db_time
+            self.serialize_time[view] += metrics.serialize_time
+            self.response_bytes[view] += size
+
+    def render(self):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, histograms):
+            for view, histogram in sorted(histograms.items()):
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum}')
+                lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+
+        def totals(name, values):
+            for view, value in sorted(values.items()):
+                lines.append(f'{name}{{view="{view}"}} {value}')
+
+        with self.lock:
+            family("api_requests_total", "counter", "Requests handled.")
+            for (view, method, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f'api_requests_total{{view="{view}",method="{method}",status="{status}"}} {count}'
+                )
+            family("api_request_duration_seconds", "histogram", "Time to build the response.")
+            histogram("api_request_duration_seconds", self.durations)
+            family("api_request_queries", "histogram", "SQL queries per request.")
+            histogram("api_request_queries", self.queries)
+            family("api_db_duration_seconds_total", "counter", "Time spent in SQL queries.")
+            totals("api_db_duration_seconds_total", self.db_time)
+            family(
+                "api_serialize_duration_seconds_total", "counter", "Time spent in serializers."
+            )
+            totals("api_serialize_duration_seconds_total", self.serialize_time)
+            family("api_response_bytes_total", "counter", "Response bytes.")
+            totals("api_response_bytes_total", self.response_bytes)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def view_label(request):
+    # URL pattern names keep the label set small; unmatched paths share one
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match.route
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        view = view_label(request)
+        if view == "metrics":
+            return response
+        if settings.SERVER_TIMING:
+            # For streamed responses, up to the headers only
+            duration = time.perf_counter() - metrics.started
+            response["Server-Timing"] = (
+                f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries", '
+                f"serialize;dur={metrics.serialize_time * 1000:.1f}, "
+                f"total;dur={duration * 1000:.1f}"
+            )
+        if response.streaming and not response.is_async:
+            response.streaming_content = measure_stream(
+                request, view, response, metrics, response.streaming_content
+            )
+        elif response.streaming:
+            record(request, view, response, metrics, 0)
+        else:
+            record(request, view, response, metrics, len(response.content))
+        return response
+
+
+def measure_stream(request, view, response, metrics, chunks):
+    # Queries and serialization while the body streams belong to the request
+    size = 0
+    while True:
+        token = _current.set(metrics)
+        try:
+            chunk = next(chunks, None)
+        finally:
+            _current.reset(token)
+        if chunk is None:
+            break
+        size += len(chunk)
+        yield chunk
+    record(request, view, response, metrics, size)
+
+
+def record(request, view, response, metrics, size):
+    duration = time.perf_counter() - metrics.started
+    registry.observe(view, request.method, response.status_code, metrics, duration, size)
+    if duration * 1000 >= settings.SLOW_REQUEST_MS:
+        log_slow_request(request, view, metrics, duration)
+
+
+def log_slow_request(request, view, metrics, duration):
+    statements = "\n".join(
+        f"  {seconds * 1000:7.1f} ms  {sql}"
+        for seconds, sql in sorted(metrics.statements, key=lambda item: -item[0])
+    )
+    logger.warning(
+        "Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, serialize %.0f ms\n%s",
+        request.method,
+        request.get_full_path(),
+        view,
+        duration * 1000,
+        metrics.queries,
+        metrics.db_time * 1000,
+        metrics.serialize_time * 1000,
+        statements,
+    )
+
+
+def metrics_view(request):
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    expected = f"Bearer {settings.METRICS_TOKEN}"
+    if not constant_time_compare(request.headers.get("Authorization", ""), expected):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4")
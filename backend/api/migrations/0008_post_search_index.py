@@ -0,0 +1,47 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "mysql":
+        schema_editor.execute(
+            "ALTER TABLE api_post ADD FULLTEXT INDEX api_post_fulltext "
+            "(title, excerpt, content)"
+        )
+        schema_editor.execute(
+            "ALTER TABLE api_category ADD FULLTEXT INDEX api_category_name_fulltext "
+            "(name)"
+        )
+    elif connection.vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE api_post_fts USING fts5("
+            "title, excerpt, content, category, "
+            "tokenize='unicode61', prefix='2 3 4')"
+        )
+        schema_editor.execute(
+            "INSERT INTO api_post_fts (rowid, title, excerpt, content, category) "
+            "SELECT p.id, p.title, p.excerpt, p.content, c.name "
+            "FROM api_post p JOIN api_category c ON c.id = p.category_id"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "mysql":
+        schema_editor.execute("ALTER TABLE api_post DROP INDEX api_post_fulltext")
+        schema_editor.execute(
+            "ALTER TABLE api_category DROP INDEX api_category_name_fulltext"
+        )
+    elif connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE api_post_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_category_created_by_category_users"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
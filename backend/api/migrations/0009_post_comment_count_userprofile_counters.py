@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-17 15:06
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, field):
+    counts = queryset.values(field).annotate(total=Count("pk")).values("total")
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def backfill_counters(apps, schema_editor):
+    # A copy of api.counters.rebuild_counters as of this migration
+    Post = apps.get_model("api", "Post")
+    Comment = apps.get_model("api", "Comment")
+    UserProfile = apps.get_model("api", "UserProfile")
+    Post.objects.update(
+        comment_count=count_of(Comment.objects.filter(post=OuterRef("pk")), "post")
+    )
+    UserProfile.objects.update(
+        post_count=count_of(Post.objects.filter(author=OuterRef("user")), "author"),
+        comment_count=count_of(
+            Comment.objects.filter(post__author=OuterRef("user")), "post__author"
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
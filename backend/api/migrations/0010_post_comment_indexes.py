@@ -0,0 +1,74 @@
+# Generated by Django 5.1.4 on 2026-10-17 15:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Lookups outside this app's models: User by email (exact, and iexact in
+# RegisterSerializer.validate_email) and Category by name__iexact. MySQL's
+# default collation is case-insensitive, so a plain index serves both kinds
+# of lookup; SQLite needs a NOCASE index for iexact (LIKE) and PostgreSQL an
+# UPPER() expression index.
+LOOKUP_INDEXES = {
+    "mysql": [
+        "CREATE INDEX api_user_email_idx ON auth_user (email)",
+    ],
+    "sqlite": [
+        "CREATE INDEX api_user_email_idx ON auth_user (email)",
+        "CREATE INDEX api_user_email_nocase_idx ON auth_user (email COLLATE NOCASE)",
+        "CREATE INDEX api_category_name_nocase_idx ON api_category (name COLLATE NOCASE)",
+    ],
+    "postgresql": [
+        "CREATE INDEX api_user_email_idx ON auth_user (email)",
+        "CREATE INDEX api_user_email_upper_idx ON auth_user (UPPER(email))",
+        "CREATE INDEX api_category_name_upper_idx ON api_category (UPPER(name))",
+    ],
+}
+
+
+def index_name(statement):
+    return statement.split()[2]
+
+
+def create_lookup_indexes(apps, schema_editor):
+    for statement in LOOKUP_INDEXES.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_lookup_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for statement in LOOKUP_INDEXES.get(vendor, []):
+        if vendor == "mysql":
+            table = statement.split(" ON ")[1].split()[0]
+            schema_editor.execute(f"DROP INDEX {index_name(statement)} ON {table}")
+        else:
+            schema_editor.execute(f"DROP INDEX {index_name(statement)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_post_comment_count_userprofile_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        # Run after auth's own migrations, which rebuild auth_user on SQLite
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created_at'], name='api_comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['created_at', 'id'], name='api_post_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'created_at'], name='api_post_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['category', 'created_at', 'id'], name='api_post_category_created_idx'),
+        ),
+        migrations.RunPython(create_lookup_indexes, drop_lookup_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-17 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_comment_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='photo_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.4 on 2026-10-17 15:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    # A copy of the category part of api.counters.rebuild_counters as of this
+    # migration; the post and user counters are kept since 0009
+    Post = apps.get_model("api", "Post")
+    Category = apps.get_model("api", "Category")
+    counts = (
+        Post.objects.filter(category=OuterRef("pk"))
+        .values("category")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    latest = Post.objects.filter(category=OuterRef("pk")).order_by("-created_at")
+    Category.objects.update(
+        post_count=Coalesce(Subquery(counts), Value(0)),
+        last_post_at=Subquery(latest.values("created_at")[:1]),
+    )
+
+
+def restore_name_index(apps, schema_editor):
+    # Adding post_count rebuilds the table on SQLite, which drops the NOCASE
+    # index created by hand in 0010_post_comment_indexes
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS api_category_name_nocase_idx "
+            "ON api_category (name COLLATE NOCASE)"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='last_post_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(restore_name_index, migrations.RunPython.noop),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
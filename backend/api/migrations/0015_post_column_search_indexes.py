@@ -0,0 +1,35 @@
+from django.db import migrations
+
+COLUMNS = ("title", "excerpt", "content")
+
+
+def split_search_index(apps, schema_editor):
+    # One FULLTEXT index per column, so api.search can weight each column.
+    # InnoDB builds one FULLTEXT index per statement
+    if schema_editor.connection.vendor == "mysql":
+        for column in COLUMNS:
+            schema_editor.execute(
+                f"ALTER TABLE api_post ADD FULLTEXT INDEX api_post_{column}_fulltext ({column})"
+            )
+        schema_editor.execute("ALTER TABLE api_post DROP INDEX api_post_fulltext")
+
+
+def merge_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "mysql":
+        schema_editor.execute(
+            "ALTER TABLE api_post ADD FULLTEXT INDEX api_post_fulltext "
+            "(title, excerpt, content)"
+        )
+        for column in COLUMNS:
+            schema_editor.execute(f"ALTER TABLE api_post DROP INDEX api_post_{column}_fulltext")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0014_related_posts"),
+    ]
+
+    operations = [
+        migrations.RunPython(split_search_index, merge_search_index),
+    ]
@@ -1,7 +1,43 @@
-from django.db import models
+import re
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 
+# How many times Post.save() re-picks a slug that was taken concurrently
+SLUG_RETRIES = 5
+
+
+def slug_usage(base_slug, exclude_pk=None):
+    """
+    Return whether `base_slug` is taken and the highest N of the `base_slug-N`
+    slugs in use (0 if none), found with a single indexed prefix query.
+    """
+    taken = Post.objects.filter(
+        models.Q(slug=base_slug) | models.Q(slug__startswith=f"{base_slug}-")
+    )
+    if exclude_pk is not None:
+        taken = taken.exclude(pk=exclude_pk)
+
+    suffix = re.compile(rf"^{re.escape(base_slug)}-(\d+)$")
+    slugs = list(taken.values_list("slug", flat=True))
+    highest = 0
+    for slug in slugs:
+        match = suffix.match(slug)
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return base_slug in slugs, highest
+
+
+def unique_slug(base_slug, exclude_pk=None):
+    """
+    Return `base_slug` if it is free, otherwise `base_slug-N` with N one past
+    the highest suffix in use.
+    """
+    taken, highest = slug_usage(base_slug, exclude_pk)
+    if not taken:
+        return base_slug
+    return f"{base_slug}-{highest + 1}"
+
 
 # User Profile Model
 class UserProfile(models.Model):
@@ -10,11 +46,53 @@ class UserProfile(models.Model):
     photo = models.ImageField(
         upload_to="profile_photos/", blank=True, null=True
     )  # Profile photo
+    # Resized copies of the photo, see api.images
+    photo_renditions = models.JSONField(default=dict, blank=True)
+    # Denormalized counters maintained in api.signals, see rebuild_counters
+    post_count = models.PositiveIntegerField(default=0)  # Posts written
+    comment_count = models.PositiveIntegerField(default=0)  # Comments received
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
 
+class PostQuerySet(models.QuerySet):
+    def with_related(self, comments=True):
+        """
+        Load everything PostSerializer touches up front so listing N posts
+        costs a fixed number of queries instead of several per row.
+
+        `comments` is True for all comments, a number for only the latest
+        that many per post (loaded into `latest_comments`), or False for none.
+        """
+        queryset = self.select_related("author__profile", "category")
+        commenters = Comment.objects.select_related("user__profile")
+        if comments is True:
+            return queryset.prefetch_related(
+                models.Prefetch("comments", queryset=commenters)
+            )
+        if comments:
+            latest = commenters.order_by("-created_at", "-id")[:comments]
+            return queryset.prefetch_related(
+                models.Prefetch("comments", queryset=latest, to_attr="latest_comments")
+            )
+        return queryset
+
+    def with_related_posts(self):
+        """Load the related posts (api.related) shown on a post's page."""
+        entries = RelatedPost.objects.select_related("related").defer("related__content")
+        return self.prefetch_related(models.Prefetch("related_posts", queryset=entries))
+
+
+class CommentQuerySet(models.QuerySet):
+    def on_posts_of(self, user):
+        """
+        Comments on the posts `user` wrote, as a join on the post's author;
+        their total is api.counters.received_comment_count().
+        """
+        return self.filter(post__author_id=user.pk)
+
+
 # Create your models here.
 class Post(models.Model):
     title = models.CharField(max_length=200)
@@ -26,32 +104,57 @@ class Post(models.Model):
         "Category", on_delete=models.CASCADE, related_name="posts"
     )
     image = models.ImageField(upload_to="post_images/", null=True)
+    # Resized copies of the image, see api.images
+    image_renditions = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained in api.signals, see rebuild_counters
+    comment_count = models.PositiveIntegerField(default=0)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Newest-first listings: all posts, an author's, a category's
+            models.Index(fields=["created_at", "id"], name="api_post_created_id_idx"),
+            models.Index(fields=["author", "created_at"], name="api_post_author_created_idx"),
+            models.Index(
+                fields=["category", "created_at", "id"],
+                name="api_post_category_created_idx",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored title so save() can tell if it changed, and the
+        # slug and category so api.signals can tell what the save moved
+        if "title" in instance.__dict__:
+            instance._loaded_title = instance.title
+            instance._loaded_slug = instance.__dict__.get("slug")
+        instance._loaded_category_id = instance.__dict__.get("category_id")
+        return instance
 
     def save(self, *args, **kwargs):
-        # Check if this is an existing instance
-        if self.pk:
-            original = Post.objects.get(pk=self.pk)
-            # Update the slug only if the title has changed
-            if original.title != self.title:
-                base_slug = slugify(self.title)
-                slug = base_slug
-                counter = 1
-                while Post.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                    slug = f"{base_slug}-{counter}"
-                    counter += 1
-                self.slug = slug
-        else:
-            # For new instances, generate a slug
+        # Only new posts and retitled posts get a fresh slug
+        if self._state.adding or self.title != getattr(self, "_loaded_title", self.title):
             base_slug = slugify(self.title)
-            slug = base_slug
-            counter = 1
-            while Post.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+            for attempt in range(SLUG_RETRIES):
+                self.slug = unique_slug(base_slug, exclude_pk=self.pk)
+                try:
+                    with transaction.atomic():
+                        super().save(*args, **kwargs)
+                    break
+                except IntegrityError:
+                    # Another request took the same slug first, pick again
+                    taken = Post.objects.filter(slug=self.slug).exclude(pk=self.pk)
+                    if attempt == SLUG_RETRIES - 1 or not taken.exists():
+                        raise
+        else:
+            super().save(*args, **kwargs)
+        self._loaded_title = self.title
+        self._loaded_slug = self.slug
+        self._loaded_category_id = self.category_id
 
 
 class Category(models.Model):
@@ -60,17 +163,94 @@ class Category(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='categories')
     users = models.ManyToManyField(User, related_name='accessible_categories')
+    # Maintained in api.signals, see rebuild_counters
+    post_count = models.PositiveIntegerField(default=0)
+    last_post_at = models.DateTimeField(null=True, blank=True)
+
+    COUNTERS = ("post_count", "last_post_at")
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # The counters only change through api.counters; saving an instance
+        # loaded before a post was added mustn't write back stale values
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTERS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
     name = models.CharField(max_length=100)  # Name of the commenter
     email = models.EmailField()  # Email of the commenter
+    # The registered user with that email, set when the comment is created;
+    # older comments are linked by `manage.py backfill_comment_users`
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="comments_written",
+    )
     content = models.TextField()  # Message content
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # A post's comments, newest first
+            models.Index(fields=["post", "created_at"], name="api_comment_post_created_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Keep the insert and the counter updates in api.signals together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Comment by {self.name} on {self.post.title}"
+
+
+# Related posts, maintained by api.related
+class PostSignature(models.Model):
+    """MinHash signature of a post's terms."""
+
+    post = models.OneToOneField(
+        Post, on_delete=models.CASCADE, primary_key=True, related_name="signature"
+    )
+    minhash = models.JSONField()
+
+
+class PostBucket(models.Model):
+    """An LSH bucket a post's signature falls in; posts sharing one are candidates."""
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="+")
+    bucket = models.BigIntegerField(db_index=True)
+
+
+class RelatedPost(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="related_posts")
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["post", "related"], name="api_relatedpost_unique")
+        ]
+
+
+class TokenRevocation(models.Model):
+    """
+    Tokens issued to the user up to revoked_at are refused, see
+    api.authentication. Keyed by user id rather than a foreign key, so the
+    revocation outlives a deleted user.
+    """
+
+    user_id = models.BigIntegerField(primary_key=True)
+    revoked_at = models.FloatField(db_index=True)
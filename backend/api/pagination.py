@@ -0,0 +1,63 @@
+from base64 import b64decode, b64encode
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (created_at, id), newest first.
+
+    The id tie-breaker keeps the ordering stable for rows created in the same
+    instant, and every page is a single indexed range scan no matter how deep
+    the client pages. The page size defaults to settings.API_PAGE_SIZE and can
+    be lowered or raised per request with ?page_size= up to max_page_size.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class SearchCursorPagination(CreatedAtCursorPagination):
+    """
+    Forward-only keyset pagination over an api.search.PostSearch.
+
+    The cursor carries the (relevance, id) of the last result on the page, so
+    each page is one ranked index query however deep the client pages.
+    """
+
+    def paginate_queryset(self, search, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        after = self.decode_position(request.query_params.get(self.cursor_query_param))
+
+        ranked = search.rank(self.page_size + 1, after)
+        self.has_next = len(ranked) > self.page_size
+        ranked = ranked[: self.page_size]
+        if self.has_next:
+            post_id, relevance = ranked[-1]
+            self.next_position = (relevance, post_id)
+        return search.fetch(ranked)
+
+    def decode_position(self, encoded):
+        if not encoded:
+            return None
+        try:
+            relevance, post_id = b64decode(encoded.encode("ascii")).decode().split("|")
+            return float(relevance), int(post_id)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        relevance, post_id = self.next_position
+        encoded = b64encode(f"{relevance!r}|{post_id}".encode()).decode("ascii")
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_previous_link(self):
+        return None
@@ -0,0 +1,259 @@
+"""
+Related posts, precomputed in the background.
+
+Each post keeps its settings.RELATED_POSTS closest posts as RelatedPost rows,
+which the post detail endpoint returns as `related_posts`. How close two posts
+are is
+
+    similarity of their terms
+    + CATEGORY_WEIGHT if they share a category
+    + AUTHOR_WEIGHT if they share an author
+
+A post's terms are the distinct words of three or more letters in its title,
+excerpt and content, common English words aside. Their Jaccard similarity is
+estimated from MinHash signatures (PostSignature). Candidates are found with
+locality-sensitive hashing: each signature is cut into BANDS bands and every
+band hashed to a PostBucket row, so posts sharing a bucket likely share terms.
+The newest posts of the same category and author are candidates as well, so
+short posts still get related posts.
+
+The work is incremental. Once a post is created, or saved with other terms
+or another category, refresh() runs after the commit on a background thread
+(settings.RELATED_POSTS_WORKERS; 0 runs it at the commit). It stores the
+post's signature, rebuilds the post's own list and offers the post to the
+lists of the candidates it scored, where it takes the place of the weakest
+entry if it beats it. Other lists are never recomputed, so run
+`manage.py rebuild_related_posts` after bulk loads such as import_content,
+and now and then to refill lists that lost entries to deleted posts.
+"""
+
+import hashlib
+import random
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+
+from .background import run_after_commit
+from .cache import GLOBAL_SCOPE, invalidate, post_scope
+from .models import Post, PostBucket, PostSignature, RelatedPost
+from .utils import batches, chunked
+
+NUM_HASHES = 64
+# 32 bands of 2 hashes: posts with a fifth of their terms in common are
+# likely to share a bucket, posts with a tenth only sometimes
+BANDS = 32
+
+CATEGORY_WEIGHT = 0.2
+AUTHOR_WEIGHT = 0.1
+
+# Upper bounds on the candidates scored per post
+MAX_BUCKET_CANDIDATES = 200
+NEWEST_CANDIDATES = 20
+
+TERM_RE = re.compile(r"[^\W\d_]{3,}")
+STOP_WORDS = frozenset(
+    "the and for are but not you all any can had her was one our out has him his how its "
+    "may new now see two way who did get let put say she too use that with have this will "
+    "your from they been were said each which their what there when make like than them "
+    "then into more some time very just over also back only most about after other could "
+    "would should these those where while because through".split()
+)
+
+# Hash functions (a * x + b) mod a Mersenne prime, the same in every process
+_PRIME = (1 << 61) - 1
+_random = random.Random(1)
+_HASHES = [(_random.randrange(1, _PRIME), _random.randrange(_PRIME)) for _ in range(NUM_HASHES)]
+
+
+def stable_hash(text):
+    # Unlike hash(), the same in every process
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+def terms(*texts):
+    return set(TERM_RE.findall(" ".join(texts).lower())) - STOP_WORDS
+
+
+def signature(words):
+    """The MinHash signature of a set of words; empty for no words."""
+    if not words:
+        return []
+    hashed = [stable_hash(word) for word in words]
+    return [min((a * x + b) % _PRIME for x in hashed) for a, b in _HASHES]
+
+
+def buckets(minhash):
+    if not minhash:
+        return []
+    rows = NUM_HASHES // BANDS
+    # Shifted into the signed range of a BigIntegerField
+    return [
+        stable_hash(f"{band}:{minhash[band * rows:(band + 1) * rows]}") - (1 << 63)
+        for band in range(BANDS)
+    ]
+
+
+def similarity(minhash, other):
+    if not minhash or not other:
+        return 0.0
+    return sum(x == y for x, y in zip(minhash, other)) / NUM_HASHES
+
+
+def store_signature(post):
+    """Save the signature of a post values() dict; return whether it changed."""
+    minhash = signature(terms(post["title"], post["excerpt"], post["content"]))
+    if minhash == post["minhash"]:
+        return False
+    post["minhash"] = minhash
+    PostSignature.objects.update_or_create(post_id=post["pk"], defaults={"minhash": minhash})
+    PostBucket.objects.filter(post=post["pk"]).delete()
+    PostBucket.objects.bulk_create(
+        PostBucket(post_id=post["pk"], bucket=bucket) for bucket in buckets(minhash)
+    )
+    return True
+
+
+def candidates(post):
+    ids = set(
+        PostBucket.objects.filter(bucket__in=buckets(post["minhash"]))
+        .exclude(post=post["pk"])
+        .values("post")
+        .annotate(shared=Count("id"))
+        .order_by("-shared")
+        .values_list("post", flat=True)[:MAX_BUCKET_CANDIDATES]
+    )
+    for field in ("category_id", "author_id"):
+        ids.update(
+            Post.objects.filter(**{field: post[field]})
+            .exclude(pk=post["pk"])
+            .order_by("-created_at")
+            .values_list("pk", flat=True)[:NEWEST_CANDIDATES]
+        )
+    return ids
+
+
+def scores(post, ids):
+    """{candidate id: score} for the candidates related at all."""
+    rows = Post.objects.filter(pk__in=ids).values_list(
+        "pk", "category_id", "author_id", "signature__minhash"
+    )
+    found = {}
+    for pk, category_id, author_id, minhash in rows:
+        score = (
+            similarity(post["minhash"], minhash)
+            + CATEGORY_WEIGHT * (category_id == post["category_id"])
+            + AUTHOR_WEIGHT * (author_id == post["author_id"])
+        )
+        if score > 0:
+            found[pk] = score
+    return found
+
+
+def update_list(post, offer=True):
+    """
+    Rebuild the related posts of a post values() dict with its signature, and
+    offer the post to its candidates' lists; return the ids of the posts
+    whose lists changed.
+    """
+    scored = scores(post, candidates(post))
+    # Ties go to the newer post
+    best = sorted(scored.items(), key=lambda item: (-item[1], -item[0]))
+    RelatedPost.objects.filter(post=post["pk"]).delete()
+    RelatedPost.objects.bulk_create(
+        [
+            RelatedPost(post_id=post["pk"], related_id=pk, score=score)
+            for pk, score in best[: settings.RELATED_POSTS]
+        ],
+        ignore_conflicts=True,
+    )
+    changed = {post["pk"]}
+    if offer:
+        changed |= offer_post(post, scored)
+    return changed
+
+
+def offer_post(post, scored):
+    # Replace where the post was listed with where it now belongs; lists
+    # that keep their entries otherwise are left alone
+    listed = RelatedPost.objects.filter(related=post["pk"])
+    changed = set(listed.values_list("post", flat=True))
+    listed.delete()
+
+    lists = defaultdict(list)
+    for entry in RelatedPost.objects.filter(post__in=scored).only("post", "score"):
+        lists[entry.post_id].append(entry)
+    added, dropped = [], []
+    for pk, score in scored.items():
+        entries = lists[pk]
+        if len(entries) >= settings.RELATED_POSTS:
+            weakest = min(entries, key=lambda entry: entry.score)
+            if score <= weakest.score:
+                continue
+            dropped.append(weakest.pk)
+        added.append(RelatedPost(post_id=pk, related_id=post["pk"], score=score))
+    RelatedPost.objects.filter(pk__in=dropped).delete()
+    RelatedPost.objects.bulk_create(added, ignore_conflicts=True)
+    return changed | {entry.post_id for entry in added}
+
+
+def refresh(post_id, force=False):
+    """
+    Update the related posts after post `post_id` was saved. Nothing is done
+    if its terms didn't change, unless `force` (say, for a new category).
+    """
+    post = (
+        Post.objects.filter(pk=post_id)
+        .values("pk", "title", "excerpt", "content", "category_id", "author_id")
+        .first()
+    )
+    if post is None:
+        return
+    post["minhash"] = (
+        PostSignature.objects.filter(post=post_id).values_list("minhash", flat=True).first()
+    )
+    with transaction.atomic():
+        if not store_signature(post) and not force:
+            return
+        changed = update_list(post)
+    slugs = Post.objects.filter(pk__in=changed).values_list("slug", flat=True)
+    invalidate(*(post_scope(slug) for slug in slugs))
+
+
+def rebuild(chunk_size=500):
+    """Recompute every signature, then every post's list; return the post count."""
+    PostSignature.objects.all().delete()
+    PostBucket.objects.all().delete()
+    posts = Post.objects.values("pk", "title", "excerpt", "content")
+    for batch in batches(chunked(posts, chunk_size), chunk_size):
+        signatures = {
+            post["pk"]: signature(terms(post["title"], post["excerpt"], post["content"]))
+            for post in batch
+        }
+        with transaction.atomic():
+            PostSignature.objects.bulk_create(
+                PostSignature(post_id=pk, minhash=minhash) for pk, minhash in signatures.items()
+            )
+            PostBucket.objects.bulk_create(
+                PostBucket(post_id=pk, bucket=bucket)
+                for pk, minhash in signatures.items()
+                for bucket in buckets(minhash)
+            )
+
+    count = 0
+    posts = Post.objects.values("pk", "category_id", "author_id", minhash=F("signature__minhash"))
+    for batch in batches(chunked(posts, chunk_size), chunk_size):
+        with transaction.atomic():
+            for post in batch:
+                update_list(post, offer=False)
+        count += len(batch)
+    invalidate(GLOBAL_SCOPE)
+    return count
+
+
+def schedule_refresh(post, force=False):
+    """Run refresh() for `post` in the background after the commit."""
+    # One worker by default, so refreshes of neighbouring posts don't race
+    run_after_commit("related-posts", settings.RELATED_POSTS_WORKERS, refresh, post.pk, force)
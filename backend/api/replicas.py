@@ -0,0 +1,116 @@
+"""
+Read replica routing.
+
+ReplicaMiddleware picks one of settings.DATABASE_REPLICAS at random for each
+GET/HEAD/OPTIONS request to the API and ReplicaRouter sends that request's
+reads there; everything else (writes, other requests, management commands,
+signal handlers outside a request) uses the primary, "default".
+
+Replicas lag behind the primary, so after a client writes through the API
+its reads stay on the primary for DATABASE_REPLICA_LAG seconds
+(read-your-writes). Clients are told apart by the user id in their JWT,
+without loading the user, or by IP address when anonymous. The response
+cache (api.cache) doesn't store pages read from a replica within that window
+of their scope changing either, as they may predate the change.
+"""
+
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# The replica the current request reads from, None for the primary
+_replica = ContextVar("replica", default=None)
+
+
+def current_replica():
+    return _replica.get()
+
+
+def client_key(request):
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = header and authentication.get_raw_token(header)
+    if raw_token:
+        try:
+            token = authentication.get_validated_token(raw_token)
+            return f"user:{token[api_settings.USER_ID_CLAIM]}"
+        except (InvalidToken, KeyError):
+            pass
+    return f"ip:{BaseThrottle().get_ident(request)}"
+
+
+def pin_key(request):
+    return f"api:db-pin:{client_key(request)}"
+
+
+def routed(request):
+    return bool(settings.DATABASE_REPLICAS) and request.path_info.startswith("/api/")
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not routed(request):
+            return self.get_response(request)
+
+        if request.method in SAFE_METHODS:
+            replica = None if cache.get(pin_key(request)) else self.choose()
+            token = _replica.set(replica)
+            try:
+                return self.get_response(request)
+            finally:
+                _replica.reset(token)
+
+        response = self.get_response(request)
+        cache.set(pin_key(request), True, timeout=settings.DATABASE_REPLICA_LAG)
+        return response
+
+    async def __acall__(self, request):
+        if not routed(request):
+            return await self.get_response(request)
+
+        if request.method in SAFE_METHODS:
+            replica = None if await cache.aget(pin_key(request)) else self.choose()
+            token = _replica.set(replica)
+            try:
+                return await self.get_response(request)
+            finally:
+                _replica.reset(token)
+
+        response = await self.get_response(request)
+        await cache.aset(pin_key(request), True, timeout=settings.DATABASE_REPLICA_LAG)
+        return response
+
+    def choose(self):
+        return random.choice(settings.DATABASE_REPLICAS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        # Explicitly, or Django would save instances read from a replica back
+        # to it
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
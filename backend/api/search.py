@@ -0,0 +1,254 @@
+"""
+Full-text search over posts.
+
+Posts are matched on title, excerpt, content and category name, ranked by
+relevance, and the last word of the query is matched as a prefix so results
+show up while the user is still typing. The index depends on the database:
+
+* MySQL: a FULLTEXT index per post column and on the category name
+  (migrations 0008 and 0015), queried in boolean mode. InnoDB keeps them up
+  to date by itself. Each column is matched by a query of its own, since
+  MySQL can't use a FULLTEXT index for either side of an OR, that keeps its
+  MAX_CANDIDATES best matches; the weighted scores are summed per post.
+* SQLite: an FTS5 table, api_post_fts, updated from the Post and Category
+  signals in api.signals. Requires SQLite built with FTS5 (the default for
+  the sqlite3 module shipped with Python). A post's bm25() for the query is
+  the sum of its bm25() for each term, so each term is scored on its own,
+  over its MAX_CANDIDATES newest matches only, read from the index in rowid
+  order. Terms in about half of the posts or more, which bm25() gives no
+  weight, are not scored at all: bm25() counts all of a term's matches.
+* Anything else: a case-insensitive substring scan.
+
+Only the candidates are scored, and they are ranked in Python, so a term
+found in most posts doesn't make the search sort all of them. Results are
+ranked by (relevance, id) descending, so the newest posts win when relevance
+alone cannot tell them apart, and pages are read by keyset on that pair, see
+api.pagination.SearchCursorPagination. Later pages don't reach past the
+candidates. Run `manage.py rebuild_search_index` to rebuild the SQLite index
+from scratch.
+"""
+
+import heapq
+import re
+from collections import defaultdict
+
+from django.db import connection, connections, router
+from django.db.models import Case, FloatField, Q, Value, When
+
+from .models import Post
+
+FTS_TABLE = "api_post_fts"
+
+# Column weights for title, excerpt, content and category name
+WEIGHTS = (10.0, 4.0, 1.0, 2.0)
+
+# Longer queries are truncated; they only make the index scan slower
+MAX_TERMS = 8
+
+# Matches of each term (SQLite) or column (MySQL) that are scored
+MAX_CANDIDATES = 1000
+
+TERM_RE = re.compile(r"\w+")
+
+
+def parse_terms(query):
+    return [term.lower() for term in TERM_RE.findall(query)][:MAX_TERMS]
+
+
+def read_connection():
+    # Searches read from a replica like the rest of the request (api.replicas);
+    # the index is maintained on the primary, `connection`
+    return connections[router.db_for_read(Post)]
+
+
+class SearchBackend:
+    def rank(self, terms, limit, after=None):
+        """
+        Return up to `limit` (post id, relevance) pairs, best first, that sort
+        after the `after` (relevance, id) pair when one is given.
+        """
+        # Candidates are few, so they are ranked here
+        ranked = (
+            (round(score, 6), post_id) for post_id, score in self.candidates(terms).items()
+        )
+        if after is not None:
+            ranked = (pair for pair in ranked if pair < tuple(after))
+        return [(post_id, score) for score, post_id in heapq.nlargest(limit, ranked)]
+
+    def candidates(self, terms):
+        """A {post id: relevance} dict of at most a few thousand matches."""
+        raise NotImplementedError
+
+    # Index maintenance hooks, no-ops where the database maintains the index
+    def index_post(self, post):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def reindex_category(self, category):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class MySQLSearchBackend(SearchBackend):
+    columns = ("title", "excerpt", "content")
+
+    def candidates(self, terms):
+        query = " ".join(terms[:-1] + [terms[-1] + "*"])
+        # The best matches of each column, on its own FULLTEXT index
+        branches, params = [], []
+        for column, weight in zip(self.columns, WEIGHTS):
+            match = f"MATCH ({column}) AGAINST (%s IN BOOLEAN MODE)"
+            branches.append(
+                f"(SELECT id, %s * {match} FROM api_post WHERE {match} "
+                f"ORDER BY {match} DESC LIMIT {MAX_CANDIDATES})"
+            )
+            params += [weight, query, query, query]
+        # Few categories match, but they may hold many posts: the newest
+        # posts of the matching categories
+        match = "MATCH (c.name) AGAINST (%s IN BOOLEAN MODE)"
+        branches.append(
+            f"(SELECT p.id, %s * {match} FROM api_category c "
+            f"JOIN api_post p ON p.category_id = c.id WHERE {match} "
+            f"ORDER BY p.created_at DESC, p.id DESC LIMIT {MAX_CANDIDATES})"
+        )
+        params += [WEIGHTS[3], query, query]
+
+        scores = defaultdict(float)
+        with read_connection().cursor() as cursor:
+            cursor.execute(" UNION ALL ".join(branches), params)
+            for post_id, score in cursor.fetchall():
+                scores[post_id] += float(score)
+        return scores
+
+
+class SQLiteSearchBackend(SearchBackend):
+    def candidates(self, terms):
+        phrases = ['"%s"' % term for term in terms]
+        phrases[-1] += "*"
+        weights = ", ".join(str(weight) for weight in WEIGHTS)
+        # bm25() is lower for better matches, so negate it
+        scored = (
+            f"SELECT rowid, -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid >= %s"
+        )
+        scores = defaultdict(float)
+        with read_connection().cursor() as cursor:
+            for phrase in phrases:
+                # The newest matches, read in rowid order without scoring them
+                cursor.execute(
+                    f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                    f"ORDER BY rowid DESC LIMIT {MAX_CANDIDATES}",
+                    [phrase],
+                )
+                window = [row[0] for row in cursor.fetchall()]
+                dense = window and window[0] - window[-1] < 2 * MAX_CANDIDATES
+                if len(window) == MAX_CANDIDATES and dense:
+                    # In over half of the recent posts, likely of all of them,
+                    # where bm25() gives it (almost) no weight
+                    for post_id in window:
+                        scores.setdefault(post_id, 0.0)
+                elif window:
+                    cursor.execute(scored, [phrase, window[-1]])
+                    for post_id, score in cursor.fetchall():
+                        scores[post_id] += score
+        return scores
+
+    def index_post(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, excerpt, content, category) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [post.pk, post.title, post.excerpt, post.content, post.category.name],
+            )
+
+    def remove_post(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+
+    def reindex_category(self, category):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {FTS_TABLE} SET category = %s "
+                "WHERE rowid IN (SELECT id FROM api_post WHERE category_id = %s)",
+                [category.name, category.pk],
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, excerpt, content, category) "
+                "SELECT p.id, p.title, p.excerpt, p.content, c.name "
+                "FROM api_post p JOIN api_category c ON c.id = p.category_id"
+            )
+
+
+class SubstringSearchBackend(SearchBackend):
+    def rank(self, terms, limit, after=None):
+        matches = Q()
+        title_match = Q()
+        for term in terms:
+            title_match |= Q(title__icontains=term)
+            matches |= (
+                Q(title__icontains=term)
+                | Q(excerpt__icontains=term)
+                | Q(content__icontains=term)
+                | Q(category__name__icontains=term)
+            )
+        queryset = Post.objects.filter(matches).annotate(
+            score=Case(
+                When(title_match, then=Value(WEIGHTS[0])),
+                default=Value(WEIGHTS[2]),
+                output_field=FloatField(),
+            )
+        )
+        if after is not None:
+            queryset = queryset.filter(
+                Q(score__lt=after[0]) | Q(score=after[0], id__lt=after[1])
+            )
+        return list(
+            queryset.order_by("-score", "-id").values_list("id", "score")[:limit]
+        )
+
+
+def get_backend():
+    vendor = read_connection().vendor
+    if vendor == "mysql":
+        return MySQLSearchBackend()
+    if vendor == "sqlite":
+        return SQLiteSearchBackend()
+    return SubstringSearchBackend()
+
+
+class PostSearch:
+    """
+    A ranked post search for `query`, paged by api.pagination.
+
+    `queryset` is used to load the posts of each page, so callers can
+    select/prefetch whatever their serializer needs.
+    """
+
+    def __init__(self, query, queryset=None):
+        self.terms = parse_terms(query)
+        self.queryset = Post.objects.all() if queryset is None else queryset
+
+    def rank(self, limit, after=None):
+        if not self.terms:
+            return []
+        return get_backend().rank(self.terms, limit, after)
+
+    def fetch(self, ranked):
+        # Load the ranked posts in rank order, tagged with their relevance
+        posts = self.queryset.in_bulk([post_id for post_id, _ in ranked])
+        results = []
+        for post_id, relevance in ranked:
+            # Skip rows deleted between ranking and loading
+            if post_id in posts:
+                posts[post_id].relevance = relevance
+                results.append(posts[post_id])
+        return results
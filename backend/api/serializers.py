@@ -1,8 +1,20 @@
-from django.contrib.auth.models import User
+from operator import attrgetter
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import User, update_last_login
+from django.conf import settings
+from django.db.models import Q
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.exceptions import AuthenticationFailed
+from .authentication import CLAIMS, add_claims, check_revocation
+from .images import rendition_urls
+from .metrics import TimedDataMixin, TimedListSerializer
 from .models import Category, Post, Comment, UserProfile
 
 
@@ -56,6 +68,11 @@ class RegisterSerializer(serializers.ModelSerializer):
 
 # Login Serializer
 class LoginTokenSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # Claims api.authentication trusts instead of loading the user
+        return add_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         login = attrs.get("username")  # Allow username or email
         password = attrs.get("password")
@@ -76,15 +93,18 @@ class LoginTokenSerializer(TokenObtainPairSerializer):
             except User.DoesNotExist:
                 raise AuthenticationFailed("No user found with this username.")
 
-        # Validate password
-        if not user.check_password(password):
+        # Validate password, hashing it only once (super().validate() would
+        # authenticate() again)
+        if not check_password(password, user.password, setter=rehash_password(user)):
             raise AuthenticationFailed("Incorrect password.")
-
-        # Set username for parent serializer validation
-        attrs["username"] = user.username
+        if not user.is_active:
+            raise AuthenticationFailed("No active account found with the given credentials")
 
         # Generate tokens
-        data = super().validate(attrs)
+        refresh = self.get_token(user)
+        data = {"refresh": str(refresh), "access": str(refresh.access_token)}
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
 
         # Add username to the response
         data["username"] = user.username
@@ -92,9 +112,84 @@ class LoginTokenSerializer(TokenObtainPairSerializer):
         return data
 
 
+def rehash_password(user):
+    # Store the hash from the preferred hasher (settings.PASSWORD_HASHERS)
+    # after a login with an outdated one. Same password, so the user's tokens
+    # are not revoked, see api.signals
+    def setter(raw_password):
+        user.set_password(raw_password)
+        user._password = None
+        user._password_rehashed = True
+        user.save(update_fields=["password"])
+
+    return setter
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        # Refresh tokens from before a revocation can't mint new access tokens
+        refresh = RefreshToken(attrs["refresh"])
+        if all(claim in refresh for claim in CLAIMS):
+            check_revocation(refresh)
+        return super().validate(attrs)
+
+
+def commenter_key(comment):
+    # Linked comments resolve by user id, older ones by email
+    if comment.user_id:
+        return ("user", comment.user_id)
+    return ("email", comment.email)
+
+
+def preload_commenters(context, comments):
+    """
+    Resolve the users behind a batch of comments in one query and keep the
+    comment -> user map in the serializer context so nested serializers reuse
+    it. Linked comments whose user came with select_related are skipped.
+    """
+    commenters = context.setdefault("commenters", {})
+    missing = {
+        commenter_key(comment)
+        for comment in comments
+        if not (comment.user_id and Comment.user.is_cached(comment))
+    } - commenters.keys()
+    if missing:
+        ids = [value for kind, value in missing if kind == "user"]
+        emails = [value for kind, value in missing if kind == "email"]
+        users = User.objects.select_related("profile").filter(
+            Q(pk__in=ids) | Q(email__in=emails)
+        )
+        for user in users:
+            if user.pk in ids:
+                commenters[("user", user.pk)] = user
+            if user.email in emails:
+                commenters[("email", user.email)] = user
+        # Remember misses too so they are not looked up again
+        for key in missing:
+            commenters.setdefault(key, None)
+    return commenters
+
+
+class CommentListSerializer(TimedListSerializer):
+    def to_representation(self, data):
+        comments = list(data.all() if hasattr(data, "all") else data)
+        preload_commenters(self.context, comments)
+        return super().to_representation(comments)
+
+
 # Comment Serializer
-class CommentSerializer(serializers.ModelSerializer):
-    slug = serializers.CharField(write_only=True)
+class CommentSerializer(TimedDataMixin, serializers.ModelSerializer):
+    # The post is looked up once, here, with what api.signals needs to drop
+    # the cached pages it appears on
+    slug = serializers.SlugRelatedField(
+        source="post",
+        slug_field="slug",
+        queryset=Post.objects.select_related("author", "category").only(
+            "id", "slug", "author__username", "category__name"
+        ),
+        write_only=True,
+        error_messages={"does_not_exist": "No post found with this slug."},
+    )
     post_slug = serializers.CharField(source="post.slug", read_only=True)
     user_image = serializers.SerializerMethodField()
     username = serializers.SerializerMethodField()
@@ -114,52 +209,115 @@ class CommentSerializer(serializers.ModelSerializer):
             "username",
         ]
         read_only_fields = ["post", "created_at"]
+        list_serializer_class = CommentListSerializer
 
-    def validate_slug(self, value):
-        # Ensure the slug corresponds to an existing post
-        try:
-            Post.objects.get(slug=value)
-        except Post.DoesNotExist:
-            raise serializers.ValidationError("No post found with this slug.")
-        return value
-
-    def get_slug(self, obj):
-        # Fetch the slug of the related post
-        if obj.post:
-            return obj.post.slug
-        return None
+    def validate_email(self, value):
+        # Registration stores emails lowercased
+        return value.lower().strip()
 
-    def create(self, validated_data):
-        # Extract slug and get the associated post
-        slug = validated_data.pop("slug")
-        post = Post.objects.get(slug=slug)
-        validated_data["post"] = post
-        return super().create(validated_data)
+    def validate(self, attrs):
+        if "email" in attrs:
+            # Link the comment to the registered user with this email, if any,
+            # and remember the answer for the response
+            attrs["user"] = (
+                User.objects.select_related("profile").filter(email=attrs["email"]).first()
+            )
+            commenters = self.context.setdefault("commenters", {})
+            commenters[("email", attrs["email"])] = attrs["user"]
+        return attrs
+
+    def update(self, instance, validated_data):
+        # Comments stay on their post
+        validated_data.pop("post", None)
+        return super().update(instance, validated_data)
+
+    def get_commenter(self, obj):
+        if obj.user_id and Comment.user.is_cached(obj):
+            return obj.user
+        # Otherwise use the batch loaded for this request, if any
+        return preload_commenters(self.context, [obj])[commenter_key(obj)]
 
     def get_user_image(self, obj):
-        try:
-            # Find user by email
-            user = User.objects.get(email=obj.email)
-            # Check if the user has a profile with a photo
-            if user.profile and user.profile.photo:
-                return user.profile.photo.url
-        except User.DoesNotExist:
-            pass  # User doesn't exist
+        user = self.get_commenter(obj)
+        # Check if the user has a profile with a photo
+        profile = getattr(user, "profile", None)
+        if profile and profile.photo:
+            return profile.photo.url
 
         return "not found"  # Default value
 
     def get_username(self, obj):
-        try:
-            user = User.objects.get(email=obj.email)
+        user = self.get_commenter(obj)
+        if user is not None:
             return user.username  # Return the username if the user exists
-        except User.DoesNotExist:
-            return "not found"  # Return 'not found' if no user is found
+        return "not found"  # Return 'not found' if no user is found
+
+
+# Comments embedded per post in list responses with ?expand=comments
+LATEST_COMMENTS = 3
+
+
+def post_list_context(request):
+    """
+    Serializer context for post listings, from the request's query string.
+
+    Listings leave out comments (use comment_count) unless the client asks
+    for ?expand=comments, which embeds the latest LATEST_COMMENTS per post.
+    ?fields=id,title,... limits each post to the named fields.
+    """
+    params = request.query_params if request else {}
+    return {
+        "post_list": True,
+        "expand": {name.strip() for name in params.get("expand", "").split(",")},
+        "fields": [name.strip() for name in params.get("fields", "").split(",") if name.strip()],
+    }
+
+
+def for_post_list(queryset, context):
+    # Only fetch the comments the representation will include
+    if not context.get("post_list"):
+        return queryset.with_related()
+    if "comments" in context["expand"]:
+        return queryset.with_related(comments=LATEST_COMMENTS)
+    return queryset.with_related(comments=False)
+
+
+def post_comments(post):
+    # The latest comments when only those were prefetched, else all of them
+    latest = getattr(post, "latest_comments", None)
+    return post.comments.all() if latest is None else latest
+
+
+class PostListSerializer(TimedListSerializer):
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, "all") else data)
+        if "comments" in self.child.fields:
+            # Resolve every commenter across all posts at once
+            preload_commenters(
+                self.context,
+                [comment for post in posts for comment in post_comments(post)],
+            )
+        return super().to_representation(posts)
+
+
+class RelatedPostSerializer(serializers.ModelSerializer):
+    """A post as linked from another post's related posts."""
+
+    image_renditions = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Post
+        fields = ["id", "title", "excerpt", "slug", "image", "image_renditions", "created_at"]
+
+    def get_image_renditions(self, obj):
+        return rendition_urls(obj, "image", self.context.get("request"))
 
 
 # PostSerializer
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(TimedDataMixin, serializers.ModelSerializer):
     author = serializers.StringRelatedField()
     author_image = serializers.SerializerMethodField()
+    author_image_renditions = serializers.SerializerMethodField()
     category = serializers.CharField(source="category.name", read_only=True)
     comments = serializers.SerializerMethodField()
     category_id = serializers.PrimaryKeyRelatedField(
@@ -168,6 +326,8 @@ class PostSerializer(serializers.ModelSerializer):
         write_only=True,
     )
     image = serializers.ImageField(required=True)
+    image_renditions = serializers.SerializerMethodField()
+    related_posts = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
@@ -178,14 +338,20 @@ class PostSerializer(serializers.ModelSerializer):
             "content",
             "slug",
             "image",
+            "image_renditions",
             "author",
             "author_image",
+            "author_image_renditions",
             "category",
             "category_id",
             "comments",
+            "comment_count",
+            "related_posts",
             "created_at",
             "updated_at",
         ]
+        read_only_fields = ["comment_count"]
+        list_serializer_class = PostListSerializer
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -193,46 +359,95 @@ class PostSerializer(serializers.ModelSerializer):
         if self.instance is not None:  # If this is an update
             self.fields["image"].required = False
 
+        # Lean representation for listings, see post_list_context
+        if self.context.get("post_list"):
+            # Related posts are for a post's own page
+            self.fields.pop("related_posts")
+            if "comments" not in self.context["expand"]:
+                self.fields.pop("comments")
+            if self.context["fields"]:
+                for name in set(self.fields) - set(self.context["fields"]):
+                    self.fields.pop(name)
+
     def get_comments(self, obj):
-        # Sort comments by latest created_at first
-        comments = obj.comments.all().order_by("-created_at")
-        return CommentSerializer(comments, many=True).data
+        # Sort comments by latest created_at first, keeping any prefetched rows
+        comments = sorted(
+            post_comments(obj), key=attrgetter("created_at"), reverse=True
+        )
+        return CommentSerializer(comments, many=True, context=self.context).data
+
+    def get_related_posts(self, obj):
+        # Best first, see api.related; with_related_posts() prefetches them
+        entries = sorted(
+            obj.related_posts.all(), key=lambda entry: (-entry.score, -entry.related_id)
+        )[: settings.RELATED_POSTS]
+        return RelatedPostSerializer(
+            [entry.related for entry in entries], many=True, context=self.context
+        ).data
 
     def get_author_image(self, obj):
-        if obj.author.profile and obj.author.profile.photo:
-            return obj.author.profile.photo.url
+        profile = getattr(obj.author, "profile", None)
+        if profile and profile.photo:
+            return profile.photo.url
         return None  # or return a default image URL
 
+    def get_image_renditions(self, obj):
+        return rendition_urls(obj, "image", self.context.get("request"))
+
+    def get_author_image_renditions(self, obj):
+        profile = getattr(obj.author, "profile", None)
+        if profile:
+            return rendition_urls(profile, "photo", self.context.get("request"))
+        return None
+
+
+# Post fields in excerpt-only feeds, such as a user's posts on their profile
+# (comments are still left out unless expanded)
+EXCERPT_FIELDS = [name for name in PostSerializer.Meta.fields if name != "content"]
+
 
 # Category Serializer
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedDataMixin, serializers.ModelSerializer):
     is_creator = serializers.SerializerMethodField()
     
     class Meta:
         model = Category
-        fields = ['id', 'name', 'description', 'is_creator']
+        fields = ['id', 'name', 'description', 'is_creator', 'post_count', 'last_post_at']
+        read_only_fields = ['post_count', 'last_post_at']
+        list_serializer_class = TimedListSerializer
 
     def get_is_creator(self, obj):
+        # Compare ids, loading created_by would cost a query per category
         request = self.context.get('request')
-        if request and request.user:
-            return obj.created_by == request.user
+        if request and request.user.is_authenticated:
+            return obj.created_by_id == request.user.pk
         return False
 
 
 # Category Detail Serializer
-class CategoryDetailSerializer(serializers.ModelSerializer):
-    posts = PostSerializer(source="posts.all", many=True, read_only=True)
+class CategoryDetailSerializer(TimedDataMixin, serializers.ModelSerializer):
+    posts = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
         fields = ["id", "name", "description", "posts"]
 
+    def get_posts(self, obj):
+        # CategoryDetailView passes the current page of posts in the context
+        posts = self.context.get("posts")
+        if posts is None:
+            posts = for_post_list(obj.posts.all(), self.context).order_by("-created_at")
+        return PostSerializer(posts, many=True, context=self.context).data
+
 
 # UserSerializer
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedDataMixin, serializers.ModelSerializer):
     bio = serializers.CharField(source='profile.bio', required=False, allow_blank=True)
     photo = serializers.ImageField(source='profile.photo', required=False, allow_null=True)
-    posts = serializers.SerializerMethodField()
+    photo_renditions = serializers.SerializerMethodField()
+    # Posts are paged separately, see UserPostListView
+    post_count = serializers.IntegerField(source="profile.post_count", read_only=True)
+    comment_count = serializers.IntegerField(source="profile.comment_count", read_only=True)
 
     class Meta:
         model = User
@@ -243,13 +458,17 @@ class UserSerializer(serializers.ModelSerializer):
             "last_name",
             "bio",
             "photo",
-            "posts",
+            "photo_renditions",
+            "post_count",
+            "comment_count",
         ]
         read_only_fields = ["username", "email"]
 
-    def get_posts(self, obj):
-        posts = obj.posts.all().order_by('-created_at')  # Assuming reverse chronological order
-        return PostSerializer(posts, many=True).data
+    def get_photo_renditions(self, obj):
+        profile = getattr(obj, "profile", None)
+        if profile:
+            return rendition_urls(profile, "photo", self.context.get("request"))
+        return None
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
@@ -0,0 +1,232 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .authentication import revoke_tokens
+from .cache import GLOBAL_SCOPE, category_scope, invalidate_on_commit, post_scope, user_scope
+from .counters import add_category_post, add_comment, add_post
+from .images import needs_renditions, schedule_renditions
+from .membership import forget_access
+from .models import Category, Comment, Post, UserProfile
+from .related import schedule_refresh
+from .search import get_backend
+
+
+def deleted_by(origin, model):
+    # `origin` is the instance or queryset delete() was called on
+    return isinstance(origin, model) or getattr(origin, "model", None) is model
+
+
+# Keep the search index in step with post writes
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    get_backend().index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_index(sender, instance, **kwargs):
+    get_backend().remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created, **kwargs):
+    if not created:
+        get_backend().reindex_category(instance)
+
+
+# Keep the counters in api.counters in step with post and comment writes
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        add_post(instance)
+        add_category_post(instance.category_id)
+    elif moved_category(instance):
+        add_category_post(instance._loaded_category_id, -1)
+        add_category_post(instance.category_id)
+
+
+def moved_category(post):
+    old = getattr(post, "_loaded_category_id", None)
+    return old is not None and old != post.category_id
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, origin=None, **kwargs):
+    if not deleted_by(origin, Category):
+        add_category_post(instance.category_id, -1)
+    # The author's profile goes too when the delete started from the user
+    if deleted_by(origin, User):
+        return
+    add_post(instance, -1)
+    # Its comments were deleted first without touching the author's total
+    UserProfile.objects.filter(user=instance.author_id).update(
+        comment_count=F("comment_count") - instance.comment_count
+    )
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        add_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, origin=None, **kwargs):
+    # Cascades from a post or user are accounted for by count_deleted_post
+    if deleted_by(origin, Comment):
+        add_comment(instance, -1)
+
+
+def related_values(posts, name, attname):
+    # `attname` of each post's `name` relation: from the related objects
+    # already loaded, the rest in one query rather than one per post
+    field = Post._meta.get_field(name)
+    values, missing = set(), set()
+    for post in posts:
+        if field.is_cached(post):
+            values.add(getattr(getattr(post, name), attname))
+        else:
+            missing.add(getattr(post, field.attname))
+    if missing:
+        values.update(
+            field.related_model.objects.filter(pk__in=missing).values_list(attname, flat=True)
+        )
+    return values
+
+
+# Drop cached responses (api.cache) that embed what changed
+def post_scopes(*posts):
+    scopes = {"recent-posts"}
+    for post in posts:
+        scopes.add(post_scope(post.slug))
+        old_slug = getattr(post, "_loaded_slug", None)
+        if old_slug:
+            scopes.add(post_scope(old_slug))
+    scopes.update(category_scope(name) for name in related_values(posts, "category", "name"))
+    scopes.update(user_scope(name) for name in related_values(posts, "author", "username"))
+    return scopes
+
+
+def invalidate_post(post):
+    invalidate_on_commit(*post_scopes(post))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    invalidate_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, origin=None, **kwargs):
+    # Cascades from a post are covered by invalidate_post_pages
+    if deleted_by(origin, Post):
+        return
+    invalidate_post(instance.post)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_category_list(sender, instance, created=True, **kwargs):
+    # The list shows each category's post count and latest post time, which
+    # change with new, moved and deleted posts (no `created` for deletes)
+    if created or moved_category(instance):
+        invalidate_on_commit("categories")
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_pages(sender, instance, **kwargs):
+    # Category names are embedded in every post
+    invalidate_on_commit("categories", category_scope(instance.name), GLOBAL_SCOPE)
+
+
+@receiver(m2m_changed, sender=Category.users.through)
+def invalidate_category_access(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and not reverse:
+        # Remember who is losing access, the rows are gone by post_clear
+        instance._cleared_user_ids = list(instance.users.values_list("pk", flat=True))
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        user_ids = [instance.pk]
+    elif action == "post_clear":
+        user_ids = getattr(instance, "_cleared_user_ids", [])
+    else:
+        user_ids = pk_set
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: forget_access(user_ids))
+    # The for_blog_form listing depends on category membership
+    invalidate_on_commit("categories")
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_pages(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    invalidate_on_commit(user_scope(instance.username), GLOBAL_SCOPE)
+
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_profile_pages(sender, instance, **kwargs):
+    # Profile photos show up next to posts and comments everywhere
+    invalidate_on_commit(GLOBAL_SCOPE)
+
+
+# Render resized copies of new uploads in the background, see api.images
+@receiver(post_save, sender=Post)
+def render_post_image(sender, instance, **kwargs):
+    if needs_renditions(instance, "image"):
+        schedule_renditions(instance, "image", post_scopes(instance))
+
+
+@receiver(post_save, sender=UserProfile)
+def render_profile_photo(sender, instance, **kwargs):
+    if needs_renditions(instance, "photo"):
+        schedule_renditions(instance, "photo", [GLOBAL_SCOPE])
+
+
+# Keep related posts (api.related) in step with post writes
+@receiver(post_save, sender=Post)
+def refresh_related_posts(sender, instance, created, **kwargs):
+    schedule_refresh(instance, force=created or moved_category(instance))
+
+
+@receiver(pre_delete, sender=Post)
+def invalidate_related_pages(sender, instance, **kwargs):
+    # Posts listing this one as related; their rows go with the cascade
+    slugs = Post.objects.filter(related_posts__related=instance).values_list("slug", flat=True)
+    invalidate_on_commit(*(post_scope(slug) for slug in slugs))
+
+
+# Revoke the tokens of users whose signed claims or credentials change
+@receiver(pre_save, sender=User)
+def check_token_claims(sender, instance, update_fields=None, **kwargs):
+    fields = {"username", "password", "is_active"} & instance.__dict__.keys()
+    if getattr(instance, "_password_rehashed", False):
+        # A new hash of the same password, see LoginTokenSerializer
+        fields.discard("password")
+        instance._password_rehashed = False
+    if update_fields is not None:
+        fields &= set(update_fields)
+    if instance._state.adding or not fields:
+        return
+    old = User.objects.filter(pk=instance.pk).values(*fields).first()
+    instance._revoke_tokens = old is not None and any(
+        old[field] != getattr(instance, field) for field in fields
+    )
+
+
+@receiver(post_save, sender=User)
+def revoke_changed_user_tokens(sender, instance, **kwargs):
+    if getattr(instance, "_revoke_tokens", False):
+        revoke_tokens(instance.pk)
+        instance._revoke_tokens = False
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    revoke_tokens(instance.pk)
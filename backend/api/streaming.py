@@ -0,0 +1,47 @@
+"""
+Streamed JSON arrays for post lists that aren't paged.
+
+stream_posts() reads the posts with QuerySet.iterator() a chunk at a time,
+serializes each chunk with PostSerializer and yields the JSON array piece by
+piece. Sent as a StreamingHttpResponse, a list holds one chunk of posts in
+memory, however many posts it has. Django runs the prefetches for each chunk,
+and commenters are resolved per chunk as well, so a list costs a few queries
+per settings.API_STREAM_CHUNK_SIZE posts.
+
+The status and headers go out before the first row is read, so an error part
+way through cuts the response short instead of turning it into an error
+response.
+"""
+
+from itertools import islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .serializers import PostSerializer
+
+
+def stream_posts(queryset, context, chunk_size=None):
+    """Yield the posts of `queryset` as a JSON array, in bytes."""
+    chunk_size = chunk_size or settings.API_STREAM_CHUNK_SIZE
+    renderer = JSONRenderer()
+    rows = queryset.iterator(chunk_size=chunk_size)
+    separator = b"["
+    while chunk := list(islice(rows, chunk_size)):
+        # Commenters are looked up per chunk and forgotten after it
+        data = PostSerializer(chunk, many=True, context={**context, "commenters": {}}).data
+        for representation in data:
+            yield separator + renderer.render(representation)
+            separator = b","
+        # Let go of the chunk before the next one is read
+        del chunk, data
+    yield b"[]" if separator == b"[" else b"]"
+
+
+def streaming_posts_response(queryset, context):
+    # Read where the request was routed, not where the iteration happens to run
+    queryset = queryset.using(queryset.db)
+    return StreamingHttpResponse(
+        stream_posts(queryset, context), content_type="application/json"
+    )
@@ -1,3 +1,1325 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import MD5PasswordHasher, PBKDF2PasswordHasher
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.db.models import Count
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from . import (
+    async_views,
+    authentication,
+    background,
+    comment_buffer,
+    compression,
+    metrics,
+    models,
+)
+from .cache import get_versions, post_scope
+from .models import Category, Comment, Post, UserProfile
+from .serializers import LoginTokenSerializer
+from .signals import post_scopes
+from .throttling import TokenBucketThrottle
+
+
+def make_user(username):
+    user = User.objects.create_user(
+        username=username, email=f"{username}@example.com", password="pass12345!"
+    )
+    UserProfile.objects.create(user=user, bio=f"{username} bio")
+    return user
+
+
+def make_posts(author, category, count, comments_per_post, commenter):
+    for i in range(count):
+        post = Post.objects.create(
+            title=f"Post {author.username} {i}",
+            excerpt="excerpt",
+            content="content",
+            author=author,
+            category=category,
+        )
+        for j in range(comments_per_post):
+            Comment.objects.create(
+                post=post,
+                name=commenter.username,
+                email=commenter.email,
+                content=f"comment {j}",
+            )
+
+
+def image_upload(name, size=(64, 64)):
+    buffer = BytesIO()
+    exif = Image.Exif()
+    exif[0x010F] = "Camera maker"
+    Image.new("RGB", size, "red").save(buffer, "JPEG", exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+# The content hash in media file names, see api.media
+HASH = "[0-9a-f]{12}"
+
+
+def use_temp_media(test):
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root)
+    settings = override_settings(MEDIA_ROOT=media_root, IMAGE_WORKERS=0)
+    settings.enable()
+    test.addCleanup(settings.disable)
+
+
+# Worker threads have their own connections, outside each test's transaction
+@override_settings(RELATED_POSTS_WORKERS=0)
+class APITestCase(TestCase):
+    def setUp(self):
+        # Cached responses would outlive each test's rolled back data
+        cache.clear()
+        self.client = APIClient()
+
+
+class PostListQueryCountTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user("author")
+        self.category = Category.objects.create(name="news", created_by=self.author)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_post_list_query_count_is_constant(self):
+        commenters = [make_user(f"reader{i}") for i in range(4)]
+        make_posts(self.author, self.category, 2, 1, commenters[0])
+        urls = [
+            "/api/posts/",
+            "/api/posts/?expand=comments",
+            "/api/users/author/",
+            "/api/users/author/posts/",
+        ]
+        small = [self.count_queries(url) for url in urls]
+
+        for commenter in commenters[1:]:
+            make_posts(self.author, self.category, 3, 4, commenter)
+        cache.clear()
+        self.assertEqual([self.count_queries(url) for url in urls], small)
+
+    def test_comment_user_fields(self):
+        reader = make_user("reader")
+        make_posts(self.author, self.category, 1, 1, reader)
+        Comment.objects.create(
+            post=Post.objects.get(), name="guest", email="guest@example.com", content="hi"
+        )
+
+        response = self.client.get("/api/posts/", {"expand": "comments"})
+        comments = response.json()["results"][0]["comments"]
+        self.assertEqual(
+            [comment["username"] for comment in comments], ["not found", "reader"]
+        )
+        self.assertEqual(comments[0]["user_image"], "not found")
+
+    def test_comments_link_to_their_user(self):
+        reader = make_user("reader")
+        make_posts(self.author, self.category, 1, 1, reader)
+        post = Post.objects.get()
+        response = self.client.post(
+            "/api/comments/",
+            {"slug": post.slug, "name": "r", "email": " Reader@Example.com", "content": "hi"},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Comment.objects.get(pk=response.json()["id"]).user, reader)
+        self.assertEqual(Comment.objects.filter(user=None).count(), 1)
+
+        call_command("backfill_comment_users", batch_size=1, stdout=StringIO())
+        self.assertFalse(Comment.objects.filter(user=None).exists())
+        # Linked commenters come with the comments, no separate lookup
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(f"/api/posts/{post.slug}/")
+        self.assertFalse(
+            [q for q in ctx.captured_queries if 'FROM "auth_user" WHERE' in q["sql"]]
+        )
+
+
+class PostListRepresentationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user("author")
+        self.category = Category.objects.create(name="news", created_by=self.author)
+        make_posts(self.author, self.category, 2, 5, self.author)
+
+    def test_lists_count_comments_instead_of_embedding_them(self):
+        post = self.client.get("/api/posts/").json()["results"][0]
+        self.assertNotIn("comments", post)
+        self.assertEqual(post["comment_count"], 5)
+        self.assertIn("comments", self.client.get(f"/api/posts/{post['slug']}/").json())
+
+    def test_expand_embeds_latest_comments(self):
+        for url in ["/api/posts/", "/api/category/news/", "/api/users/author/posts/"]:
+            data = self.client.get(url, {"expand": "comments"}).json()
+            posts = data.get("results") or data["posts"]
+            contents = [comment["content"] for comment in posts[0]["comments"]]
+            self.assertEqual(contents, ["comment 4", "comment 3", "comment 2"])
+
+    def test_sparse_fields(self):
+        data = self.client.get("/api/posts/", {"fields": "title,slug,bogus"}).json()
+        self.assertEqual(set(data["results"][0]), {"title", "slug"})
+
+    def test_profile_pages_posts_separately(self):
+        with CaptureQueriesContext(connection) as ctx:
+            user = self.client.get("/api/users/author/").json()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn("posts", user)
+        self.assertEqual((user["post_count"], user["comment_count"]), (2, 10))
+
+        page = self.client.get("/api/users/author/posts/", {"page_size": 1}).json()
+        self.assertNotIn("content", page["results"][0])
+        self.assertIn("excerpt", page["results"][0])
+        self.assertIsNotNone(page["next"])
+        self.assertEqual(self.client.get("/api/users/nobody/posts/").status_code, 404)
+
+    @override_settings(API_STREAM_CHUNK_SIZE=2)
+    def test_own_posts_are_streamed_in_chunks(self):
+        reader = make_user("reader")
+        make_posts(self.author, self.category, 3, 1, reader)
+        self.client.force_authenticate(self.author)
+
+        response = self.client.get("/api/user/posts/", {"expand": "comments"})
+        self.assertTrue(response.streaming)
+        with CaptureQueriesContext(connection) as ctx:
+            posts = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(posts), 5)
+        self.assertEqual(posts[-1]["comments"][0]["username"], "reader")
+        # One posts query read in chunks, then comments and commenters per chunk
+        self.assertEqual(len(ctx.captured_queries), 1 + 2 * 3)
+
+        self.client.force_authenticate(reader)
+        self.assertEqual(b"".join(self.client.get("/api/user/posts/").streaming_content), b"[]")
+
+
+class CursorPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user("author")
+        self.category = Category.objects.create(name="news", created_by=self.author)
+        make_posts(self.author, self.category, 5, 0, self.author)
+
+    def walk(self, url):
+        slugs = []
+        while url:
+            data = self.client.get(url).json()
+            page = data["results"] if "results" in data else data["posts"]
+            self.assertLessEqual(len(page), 2)
+            slugs += [post["slug"] for post in page]
+            url = data["next"]
+        return slugs
+
+    def test_post_list_pages_newest_first(self):
+        expected = list(
+            Post.objects.order_by("-created_at", "-id").values_list("slug", flat=True)
+        )
+        self.assertEqual(self.walk("/api/posts/?page_size=2"), expected)
+
+    def test_category_detail_pages_posts(self):
+        slugs = self.walk("/api/category/news/?page_size=2")
+        self.assertEqual(len(slugs), 5)
+        self.assertEqual(len(set(slugs)), 5)
+
+
+class PostSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user("author")
+        self.category = Category.objects.create(name="travel", created_by=self.author)
+
+    def create_post(self, title, content="content"):
+        return Post.objects.create(
+            title=title,
+            excerpt="excerpt",
+            content=content,
+            author=self.author,
+            category=self.category,
+        )
+
+    def search(self, query):
+        response = self.client.get("/api/posts/search/", {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return [post["title"] for post in response.json()["results"]]
+
+    def test_ranks_title_matches_first(self):
+        self.create_post("Cooking at home", content="a django tutorial in passing")
+        self.create_post("Django tips")
+        self.assertEqual(self.search("django"), ["Django tips", "Cooking at home"])
+
+    def test_prefix_and_category_match(self):
+        self.create_post("Mountain trails")
+        self.assertEqual(self.search("mount"), ["Mountain trails"])
+        self.assertEqual(self.search("travel"), ["Mountain trails"])
+        self.assertEqual(self.search(""), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = self.create_post("Old title")
+        post.title = "New heading"
+        post.save()
+        self.assertEqual(self.search("old"), [])
+        self.assertEqual(self.search("heading"), ["New heading"])
+
+        self.category.name = "journeys"
+        self.category.save()
+        self.assertEqual(self.search("journeys"), ["New heading"])
+
+        post.delete()
+        self.assertEqual(self.search("heading"), [])
+
+    def test_pages_through_ranked_results(self):
+        for i in range(5):
+            self.create_post(f"Walk {i}", content="walk " * i)
+        url, titles = "/api/posts/search/?q=walk&page_size=2", []
+        while url:
+            data = self.client.get(url).json()
+            titles += [post["title"] for post in data["results"]]
+            url = data["next"]
+        self.assertEqual(sorted(titles), [f"Walk {i}" for i in range(5)])
+        response = self.client.get("/api/posts/search/", {"q": "walk", "cursor": "x"})
+        self.assertEqual(response.status_code, 404)
+
+    @mock.patch("api.search.MAX_CANDIDATES", 2)
+    def test_scores_only_the_newest_matches_of_common_terms(self):
+        for title in ["Hike 1", "Hike 2", "Hike 3", "Notes"]:
+            self.create_post(title, content="hike")
+            for _ in range(3):
+                self.create_post("Unrelated")
+        # Ranked among the two newest matches
+        self.assertEqual(self.search("hike"), ["Hike 3", "Notes"])
+
+        # In most of the recent posts: newest first, unscored
+        for i in range(1, 4):
+            self.create_post(f"Walk {4 - i}", content="walk " * i)
+        self.assertEqual(self.search("walk"), ["Walk 1", "Walk 2"])
+
+
+class PostSlugTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user("author")
+        self.category = Category.objects.create(name="news", created_by=self.author)
+
+    def create_post(self, title):
+        return Post.objects.create(
+            title=title,
+            excerpt="excerpt",
+            content="content",
+            author=self.author,
+            category=self.category,
+        )
+
+    def test_collisions_take_next_suffix_in_one_query(self):
+        self.assertEqual(self.create_post("Hello World").slug, "hello-world")
+        self.create_post("Hello World")
+        self.create_post("Hello World Tips")
+        with CaptureQueriesContext(connection) as ctx:
+            post = self.create_post("Hello World")
+        self.assertEqual(post.slug, "hello-world-2")
+        slug_queries = [
+            q for q in ctx.captured_queries if q["sql"].startswith('SELECT "api_post"')
+        ]
+        self.assertEqual(len(slug_queries), 1)
+
+    def test_slug_changes_only_with_title(self):
+        post = self.create_post("First title")
+        post = Post.objects.get(pk=post.pk)
+        post.content = "edited"
+        with CaptureQueriesContext(connection) as ctx:
+            post.save()
+        self.assertEqual(post.slug, "first-title")
+        post_selects = [
+            q for q in ctx.captured_queries if q["sql"].startswith('SELECT "api_post"')
+        ]
+        self.assertEqual(post_selects, [])
+
+        post.title = "Second title"
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).slug, "second-title")
+
+    def test_retries_when_slug_is_taken_concurrently(self):
+        self.create_post("Race")
+        # Simulate a concurrent insert winning the slug picked first
+        real_unique_slug = models.unique_slug
+        picks = iter(["race", "race-1"])
+        models.unique_slug = lambda base_slug, exclude_pk=None: next(picks)
+        try:
+            self.assertEqual(self.create_post("Race").slug, "race-1")
+        finally:
+            models.unique_slug = real_unique_slug
+
+
+class DashboardCounterTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user("author")
+        self.reader = make_user("reader")
+        self.category = Category.objects.create(name="news", created_by=self.author)
+        self.client.force_authenticate(self.author)
+
+    def dashboard(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get("/api/dashboard/").json()
+        return data, len(ctx.captured_queries)
+
+    def test_counters_follow_writes(self):
+        make_posts(self.author, self.category, 3, 2, self.reader)
+        data, small = self.dashboard()
+        self.assertEqual(small, 3)
+        self.assertEqual((data["totalPosts"], data["totalComments"]), (3, 6))
+        self.assertEqual(data["recentPosts"][0]["comments_count"], 2)
+
+        make_posts(self.author, self.category, 5, 4, self.reader)
+        data, queries = self.dashboard()
+        self.assertEqual(queries, small)
+        self.assertEqual((data["totalPosts"], data["totalComments"]), (8, 26))
+
+        Comment.objects.filter(post__author=self.author).first().delete()
+        Post.objects.filter(author=self.author).first().delete()
+        profile = UserProfile.objects.get(user=self.author)
+        self.assertEqual(profile.post_count, Post.objects.count())
+        self.assertEqual(profile.comment_count, Comment.objects.count())
+
+    def test_users_without_a_profile_are_counted(self):
+        make_posts(self.author, self.category, 2, 3, self.reader)
+        UserProfile.objects.filter(user=self.author).delete()
+        data, _ = self.dashboard()
+        self.assertEqual((data["totalPosts"], data["totalComments"]), (2, 6))
+
+    def test_comment_list_shares_the_dashboard_total(self):
+        make_posts(self.author, self.category, 3, 2, self.reader)
+        make_posts(self.reader, self.category, 1, 2, self.author)
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get("/api/comments/", {"page_size": 4}).json()
+        # The page joins on the post's author, then the commenters are looked
+        # up and the total is read from the profile counter
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertNotIn("IN (SELECT", ctx.captured_queries[0]["sql"])
+        self.assertEqual(data["total_user_comments"], 6)
+
+        dashboard, _ = self.dashboard()
+        self.assertEqual(dashboard["totalComments"], data["total_user_comments"])
+        self.assertEqual(
+            [comment["content"] for comment in dashboard["recentComments"]],
+            [comment["content"] for comment in data["comments"]],
+        )
+
+    def test_rebuild_counters(self):
+        make_posts(self.author, self.category, 2, 3, self.reader)
+        Post.objects.update(comment_count=0)
+        UserProfile.objects.update(post_count=0, comment_count=0)
+
+        call_command("rebuild_counters", stdout=StringIO())
+        self.assertEqual(
+            list(Post.objects.values_list("comment_count", flat=True)), [3, 3]
+        )
+        profile = UserProfile.objects.get(user=self.author)
+        self.assertEqual((profile.post_count, profile.comment_count), (2, 6))
+
+
+class CategoryListTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user("author")
+        self.reader = make_user("reader")
+        self.news = Category.objects.create(name="news", created_by=self.author)
+        self.sport = Category.objects.create(name="sport", created_by=self.reader)
+
+    def counters(self):
+        return dict(
+            (name, (count, latest))
+            for name, count, latest in Category.objects.values_list(
+                "name", "post_count", "last_post_at"
+            )
+        )
+
+    def test_lists_counts_in_one_query(self):
+        make_posts(self.author, self.news, 3, 0, self.reader)
+        self.client.force_authenticate(self.author)
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get("/api/category/").json()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(
+            [(row["name"], row["post_count"], row["is_creator"]) for row in data],
+            [("news", 3, True), ("sport", 0, False)],
+        )
+        self.assertIsNotNone(data[0]["last_post_at"])
+
+    def test_counters_follow_writes(self):
+        make_posts(self.author, self.news, 3, 0, self.reader)
+        first, second, latest = Post.objects.order_by("created_at")
+        self.assertEqual(self.counters()["news"], (3, latest.created_at))
+
+        latest.category = self.sport
+        latest.save()
+        self.assertEqual(
+            self.counters(),
+            {"news": (2, second.created_at), "sport": (1, latest.created_at)},
+        )
+
+        second.delete()
+        self.author.delete()
+        self.assertEqual(self.counters(), {"news": (0, None), "sport": (0, None)})
+
+        make_posts(self.reader, self.sport, 2, 0, self.reader)
+        Category.objects.update(post_count=0, last_post_at=None)
+        call_command("rebuild_counters", stdout=StringIO())
+        self.assertEqual(
+            self.counters()["sport"], (2, Post.objects.latest("created_at").created_at)
+        )
+
+
+class CommentWriteTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user("author")
+        self.category = Category.objects.create(name="news", created_by=self.author)
+        make_posts(self.author, self.category, 1, 0, self.author)
+        self.post = Post.objects.get()
+
+    def comment(self, email="reader@example.com", **extra):
+        data = {"slug": self.post.slug, "name": "reader", "email": email, "content": "hi"}
+        return self.client.post("/api/comments/", data, **extra)
+
+    def test_looks_the_post_up_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.comment(email=self.author.email)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["username"], "author")
+        selects = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 2)
+        response = self.client.post(
+            "/api/comments/",
+            {"slug": "nope", "name": "r", "email": "r@example.com", "content": "hi"},
+        )
+        self.assertEqual(response.json(), {"slug": ["No post found with this slug."]})
+
+    def test_token_buckets_per_ip_and_email(self):
+        clock = mock.Mock(return_value=1000.0)
+        rates = {"comments-ip": "4/min", "comments-email": "2/min"}
+        with mock.patch.object(TokenBucketThrottle, "THROTTLE_RATES", rates), \
+                mock.patch.object(TokenBucketThrottle, "timer", clock):
+            statuses = [self.comment().status_code for _ in range(3)]
+            self.assertEqual(statuses, [201, 201, 429])
+            self.assertEqual(self.comment(email="other@example.com").status_code, 201)
+            # Refused requests still cost the address a token: it's out now
+            # too, other addresses aren't
+            self.assertEqual(self.comment(email="third@example.com").status_code, 429)
+            self.assertEqual(
+                self.comment(email="third@example.com", REMOTE_ADDR="10.0.0.2").status_code,
+                201,
+            )
+
+            # One token back every 15s for the address, every 30s for the email
+            clock.return_value += 30
+            self.assertEqual(self.comment().status_code, 201)
+            self.assertEqual(self.comment().status_code, 429)
+
+    @override_settings(COMMENT_BUFFER_SIZE=3, COMMENT_BUFFER_INTERVAL=0)
+    def test_buffered_comments_are_written_in_batches(self):
+        self.addCleanup(comment_buffer.flush)
+        detail = f"/api/posts/{self.post.slug}/"
+        self.assertEqual(self.client.get(detail).json()["comment_count"], 0)
+
+        responses = [self.comment(email=f"r{i}@example.com") for i in range(2)]
+        self.assertEqual([r.status_code for r in responses], [202, 202])
+        self.assertIsNone(responses[0].json()["id"])
+        self.assertFalse(Comment.objects.exists())
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.comment(email=self.author.email).status_code, 202)
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Comment.objects.count(), 3)
+        self.assertEqual(Comment.objects.filter(user=self.author).count(), 1)
+        self.assertEqual(self.client.get(detail).json()["comment_count"], 3)
+        self.assertEqual(UserProfile.objects.get(user=self.author).comment_count, 3)
+
+    @override_settings(COMMENT_BUFFER_SIZE=2, COMMENT_BUFFER_INTERVAL=0)
+    def test_buffered_comments_survive_failed_writes(self):
+        self.addCleanup(comment_buffer.flush)
+        other = Post.objects.create(
+            title="Other", excerpt="e", content="c", author=self.author, category=self.category
+        )
+        data = {"slug": other.slug, "name": "reader", "email": "r0@example.com", "content": "hi"}
+        self.assertEqual(self.client.post("/api/comments/", data).status_code, 202)
+        other.delete()
+        # The comment on the deleted post is dropped, not the whole batch
+        with self.assertLogs("api.comment_buffer", "WARNING"):
+            self.assertEqual(self.comment(email="r1@example.com").status_code, 202)
+        self.assertEqual(list(Comment.objects.values_list("email", flat=True)), ["r1@example.com"])
+
+        # A failed write keeps the batch queued for the next flush
+        self.comment(email="r2@example.com")
+        with mock.patch.object(
+            Comment.objects, "bulk_create", side_effect=OperationalError("gone away")
+        ), self.assertLogs("api.comment_buffer", "ERROR"):
+            self.assertEqual(self.comment(email="r3@example.com").status_code, 202)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(comment_buffer.flush(), 2)
+        self.assertEqual(Comment.objects.count(), 3)
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user("author")
+        self.category = Category.objects.create(name="news", created_by=self.author)
+        make_posts(self.author, self.category, 2, 1, self.author)
+        self.post = Post.objects.first()
+
+    def get(self, url, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, headers=headers)
+        return response, len(ctx.captured_queries)
+
+    def test_hits_skip_the_database_and_revalidate(self):
+        url = f"/api/posts/{self.post.slug}/"
+        first, _ = self.get(url)
+        second, queries = self.get(url)
+        self.assertEqual(queries, 0)
+        self.assertEqual(second.json(), first.json())
+
+        not_modified, _ = self.get(url, if_none_match=first["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        since, _ = self.get(url, if_modified_since=first["Last-Modified"])
+        self.assertEqual(since.status_code, 304)
+
+    def test_writes_invalidate_affected_pages(self):
+        urls = [
+            f"/api/posts/{self.post.slug}/",
+            "/api/posts/recent/",
+            "/api/category/news/",
+            "/api/users/author/",
+        ]
+        before = [self.get(url)[0].json() for url in urls]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(
+                post=self.post, name="guest", email="guest@example.com", content="new"
+            )
+        after = [self.get(url)[0].json() for url in urls]
+        for old, new in zip(before, after):
+            self.assertNotEqual(old, new)
+
+    def test_invalidation_waits_for_the_commit(self):
+        scopes = [post_scope(self.post.slug), "recent-posts"]
+        versions = get_versions(scopes)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Comment.objects.create(
+                post=self.post, name="guest", email="guest@example.com", content="new"
+            )
+            # A read racing the write must not cache its rows as current
+            self.assertEqual(get_versions(scopes), versions)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_versions(scopes)[0], versions[0])
+        self.assertNotEqual(get_versions(scopes)[1], versions[1])
+
+    def test_retitled_post_drops_old_slug(self):
+        old_url = f"/api/posts/{self.post.slug}/"
+        self.assertEqual(self.get(old_url)[0].status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = "Renamed"
+            self.post.save()
+        self.assertEqual(self.get(old_url)[0].status_code, 404)
+
+    def test_scopes_read_names_once(self):
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(2):
+            scopes = post_scopes(*posts)
+        self.assertTrue({"category:news", "user:author"} <= scopes)
+        posts = list(Post.objects.select_related("category", "author"))
+        with self.assertNumQueries(0):
+            self.assertEqual(post_scopes(*posts), scopes)
+
+    def test_category_list_varies_by_user(self):
+        self.assertFalse(self.get("/api/category/")[0].json()[0]["is_creator"])
+        self.client.force_authenticate(self.author)
+        self.assertTrue(self.get("/api/category/")[0].json()[0]["is_creator"])
+
+
+class QueryPlanTests(APITestCase):
+    """EXPLAIN the main queries behind each endpoint and fail on full scans."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = make_user("author")
+        self.category = Category.objects.create(name="news", created_by=self.author)
+        make_posts(self.author, self.category, 3, 2, self.author)
+        self.post = Post.objects.first()
+
+    def assert_indexed(self, queryset, ordered=False):
+        if connection.vendor == "mysql":
+            plan = queryset.explain(format="json")
+            self.assertNotIn('"access_type": "ALL"', plan, plan)
+            if ordered:
+                self.assertNotIn('"using_filesort": true', plan, plan)
+        elif connection.vendor == "sqlite":
+            plan = queryset.explain()
+            # "SCAN table" without "USING ... INDEX" reads every row
+            self.assertIsNone(re.search(r"SCAN \w+$", plan, re.MULTILINE), plan)
+            if ordered:
+                self.assertNotIn("TEMP B-TREE FOR ORDER BY", plan, plan)
+        else:
+            self.skipTest(f"No query plan checks for {connection.vendor}")
+
+    def test_post_queries(self):
+        self.assert_indexed(Post.objects.filter(slug=self.post.slug))
+        self.assert_indexed(Post.objects.order_by("-created_at", "-id")[:20], ordered=True)
+        self.assert_indexed(
+            Post.objects.filter(author=self.author).order_by("-created_at"), ordered=True
+        )
+        self.assert_indexed(
+            Post.objects.filter(category=self.category).order_by("-created_at", "-id")[:20],
+            ordered=True,
+        )
+
+    def test_comment_queries(self):
+        self.assert_indexed(
+            Comment.objects.filter(post=self.post).order_by("-created_at"), ordered=True
+        )
+        self.assert_indexed(Comment.objects.filter(post__author=self.author))
+
+    def test_lookup_queries(self):
+        self.assert_indexed(User.objects.filter(email="author@example.com"))
+        self.assert_indexed(User.objects.filter(email__iexact="Author@Example.com"))
+        self.assert_indexed(User.objects.filter(email__in=["a@example.com", "b@example.com"]))
+        self.assert_indexed(Category.objects.filter(name__iexact="News"))
+
+
+class ImageRenditionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        use_temp_media(self)
+        self.author = make_user("author")
+        self.category = Category.objects.create(name="news", created_by=self.author)
+
+    def test_renders_resized_copies_without_metadata(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(
+                title="Photo",
+                excerpt="excerpt",
+                content="content",
+                author=self.author,
+                category=self.category,
+                image=image_upload("photo.jpg", (2400, 1200)),
+            )
+        post.refresh_from_db()
+        self.assertEqual(post.image_renditions["source"], post.image.name)
+        for size, box in [("thumbnail", 200), ("card", 640), ("full", 1600)]:
+            for extension in ["webp", "jpeg"]:
+                path = post.image_renditions[size][extension]
+                self.assertRegex(
+                    path, rf"^renditions/post_images/photo\.{HASH}/{size}\.{HASH}\.{extension}$"
+                )
+                with Image.open(default_storage.open(path)) as image:
+                    self.assertEqual(image.size, (box, box // 2))
+                    self.assertFalse(image.getexif())
+
+        data = self.client.get(f"/api/posts/{post.slug}/").json()
+        self.assertRegex(
+            data["image_renditions"]["card"]["webp"],
+            rf"/media/renditions/post_images/photo\.{HASH}/card\.{HASH}\.webp$",
+        )
+
+        # A new upload hides the old renditions until its own are ready
+        with mock.patch("api.images.generate_renditions"):
+            with self.captureOnCommitCallbacks(execute=True):
+                post.image = image_upload("other.jpg", (100, 100))
+                post.save()
+        data = self.client.get(f"/api/posts/{post.slug}/").json()
+        self.assertIsNone(data["image_renditions"])
+
+        call_command("generate_renditions", stdout=StringIO())
+        data = self.client.get(f"/api/posts/{post.slug}/").json()
+        self.assertRegex(
+            data["image_renditions"]["full"]["jpeg"],
+            rf"/media/renditions/post_images/other\.{HASH}/full\.{HASH}\.jpeg$",
+        )
+
+
+class AsyncViewTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user("author")
+        self.category = Category.objects.create(name="news", created_by=self.author)
+        make_posts(self.author, self.category, 3, 2, make_user("reader"))
+        self.post = Post.objects.first()
+        Comment.objects.create(
+            post=self.post, name="guest", email="guest@example.com", content="hi"
+        )
+
+    async def test_async_views_match_sync_views(self):
+        slug = self.post.slug
+        cases = [
+            (f"/api/posts/{slug}/", async_views.post_detail, {"slug": slug}),
+            ("/api/posts/missing/", async_views.post_detail, {"slug": "missing"}),
+            ("/api/posts/recent/?expand=comments", async_views.recent_posts, {}),
+            ("/api/posts/search/?q=post&page_size=2", async_views.post_search, {}),
+            ("/api/posts/search/?q=post&cursor=bad", async_views.post_search, {}),
+            ("/api/category/news/?page_size=2&expand=comments", async_views.category_detail, {"name": "news"}),
+        ]
+        for url, view, kwargs in cases:
+            with self.subTest(url):
+                await sync_to_async(cache.clear)()
+                expected = await sync_to_async(self.client.get)(url)
+                # Cached entries are shared, then rebuilt by the async view
+                shared = await view(AsyncRequestFactory().get(url), **kwargs)
+                await sync_to_async(cache.clear)()
+                response = await view(AsyncRequestFactory().get(url), **kwargs)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(json.loads(response.content), expected.json())
+                self.assertEqual(response.get("ETag"), expected.get("ETag"))
+                self.assertEqual(shared.get("ETag"), expected.get("ETag"))
+
+        # Writes go through the sync view and its permissions
+        request = AsyncRequestFactory().delete(f"/api/posts/{slug}/")
+        response = await async_views.post_detail(request, slug=slug)
+        self.assertEqual(response.status_code, 401)
+
+
+class CategoryAccessTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user("owner")
+        self.member = make_user("member")
+        self.category = Category.objects.create(name="news", created_by=self.owner)
+        self.category.users.add(self.owner)
+        use_temp_media(self)
+
+    def create_post(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(
+            "/api/posts/",
+            {
+                "title": "Hello",
+                "excerpt": "e",
+                "content": "c",
+                "category_id": self.category.pk,
+                "image": image_upload("hello.jpg"),
+            },
+        )
+
+    def blog_form_categories(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get("/api/category/", {"for_blog_form": "true"})
+        return [category["name"] for category in response.json()]
+
+    def test_access_follows_membership_changes(self):
+        from .membership import has_access
+
+        self.assertEqual(self.create_post(self.member).status_code, 403)
+        self.assertEqual(self.blog_form_categories(self.member), [])
+        with self.assertNumQueries(0):
+            self.assertFalse(has_access(self.member, self.category))
+
+        # Asking for an existing category joins it
+        self.client.force_authenticate(self.member)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/category/", {"name": "News"})
+        self.assertIn("added to your list", response.json()["message"])
+        self.assertEqual(self.blog_form_categories(self.member), ["news"])
+        self.assertEqual(self.create_post(self.member).status_code, 201)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member.accessible_categories.remove(self.category)
+        self.assertEqual(self.create_post(self.member).status_code, 403)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.users.add(self.member)
+            self.category.users.clear()
+        self.assertEqual(self.blog_form_categories(self.member), [])
+        self.assertEqual(self.blog_form_categories(self.owner), [])
+
+
+class ClaimsAuthenticationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user("writer")
+        response = self.client.post(
+            "/api/login/", {"username": "writer", "password": "pass12345!"}
+        )
+        self.tokens = response.json()
+
+    def get_posts(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return self.client.get("/api/user/posts/")
+
+    def test_authenticates_from_claims(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get_posts(self.tokens["access"])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'FROM "auth_user"' in q["sql"]])
+
+    def test_revokes_tokens_when_credentials_change(self):
+        self.user.first_name = "Renamed"
+        self.user.save()
+        self.assertEqual(self.get_posts(self.tokens["access"]).status_code, 200)
+
+        self.user.set_password("another12345!")
+        self.user.save()
+        self.assertEqual(self.get_posts(self.tokens["access"]).status_code, 401)
+        self.client.credentials()
+        response = self.client.post("/api/token/refresh/", {"refresh": self.tokens["refresh"]})
+        self.assertEqual(response.status_code, 401)
+
+        # Logging in again issues tokens that work
+        tokens = self.client.post(
+            "/api/login/", {"username": "writer", "password": "another12345!"}
+        ).json()
+        self.assertEqual(self.get_posts(tokens["access"]).status_code, 200)
+
+    def test_revocations_outlive_the_cache(self):
+        self.user.is_active = False
+        self.user.save()
+        cache.clear()
+        authentication._revocations.clear()
+        self.assertEqual(self.get_posts(self.tokens["access"]).status_code, 401)
+
+    def test_login_hashes_once_and_rehashes_outdated_hashes(self):
+        verify = mock.patch.object(
+            PBKDF2PasswordHasher, "verify", autospec=True, side_effect=PBKDF2PasswordHasher.verify
+        )
+        with verify as verify:
+            self.client.post("/api/login/", {"username": "writer", "password": "pass12345!"})
+        self.assertEqual(verify.call_count, 1)
+
+        hashers = [
+            "django.contrib.auth.hashers.MD5PasswordHasher",
+            "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        ]
+        with override_settings(PASSWORD_HASHERS=hashers):
+            response = self.client.post(
+                "/api/login/", {"username": "writer@example.com", "password": "pass12345!"}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith(MD5PasswordHasher.algorithm))
+        # Same password, so earlier tokens keep working
+        self.assertEqual(self.get_posts(self.tokens["access"]).status_code, 200)
+
+
+class ContentTransferTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user("author")
+        self.reader = make_user("reader")
+        self.category = Category.objects.create(name="news", created_by=self.author)
+        self.category.users.add(self.author, self.reader)
+        make_posts(self.author, self.category, 3, 2, self.reader)
+        Post.objects.create(
+            title="Post author 0 again",
+            excerpt="excerpt",
+            content="mountain trails",
+            author=self.author,
+            category=self.category,
+        )
+
+    def export(self):
+        out = StringIO()
+        call_command("export_content", stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_round_trip(self):
+        dump = self.export()
+        posts = list(Post.objects.order_by("pk").values_list("slug", "created_at"))
+        Category.objects.all().delete()
+        self.assertFalse(Post.objects.exists())
+
+        with mock.patch("sys.stdin", StringIO(dump)):
+            call_command("import_content", batch_size=2, stderr=StringIO())
+
+        self.assertEqual(
+            list(Post.objects.order_by("pk").values_list("slug", "created_at")), posts
+        )
+        self.assertEqual(Comment.objects.filter(user=self.reader).count(), 6)
+        self.assertEqual(self.export(), dump)
+        category = Category.objects.get(name="news")
+        self.assertEqual(set(category.users.all()), {self.author, self.reader})
+        self.assertEqual(UserProfile.objects.get(user=self.author).post_count, 4)
+        results = self.client.get("/api/posts/search/", {"q": "mountain"}).json()["results"]
+        self.assertEqual([post["slug"] for post in results], ["post-author-0-again"])
+
+        # Importing again only adds rows whose natural key is new: the posts
+        # come in under fresh slugs
+        with mock.patch("sys.stdin", StringIO(dump)):
+            call_command("import_content", stderr=StringIO())
+        self.assertEqual(Category.objects.count(), 1)
+        slugs = set(Post.objects.values_list("slug", flat=True))
+        self.assertEqual(len(slugs), 8)
+        self.assertIn("post-author-0-1", slugs)
+        # Comments come with their copy of the post, not the original
+        self.assertEqual(
+            dict(Post.objects.annotate(total=Count("comments")).values_list("slug", "total")),
+            {
+                "post-author-0": 2,
+                "post-author-1": 2,
+                "post-author-2": 2,
+                "post-author-0-again": 0,
+                "post-author-0-1": 2,
+                "post-author-1-1": 2,
+                "post-author-2-1": 2,
+                "post-author-0-again-1": 0,
+            },
+        )
+
+    def test_export_reads_members_per_chunk(self):
+        for name in ("sports", "travel", "food"):
+            Category.objects.create(name=name, created_by=self.author).users.add(self.reader)
+        with CaptureQueriesContext(connection) as ctx:
+            dump = self.export()
+        self.assertEqual(
+            len([q for q in ctx.captured_queries if 'FROM "api_category_users"' in q["sql"]]), 1
+        )
+        self.assertIn('"users": ["reader"]', dump)
+
+
+class ReplicaRoutingTests(APITestCase):
+    # A second database (see backend.test_settings) stands in for the
+    # replica; nothing replicates to it, so what a request reads shows where
+    # it was routed
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        super().setUp()
+        replicas = override_settings(DATABASE_REPLICAS=["replica"])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+
+        self.author = make_user("author")
+        self.category = Category.objects.create(name="news", created_by=self.author)
+        self.post = Post.objects.create(
+            title="Fresh title",
+            excerpt="excerpt",
+            content="content",
+            author=self.author,
+            category=self.category,
+        )
+        # The replica's stale copy
+        User.objects.using("replica").bulk_create([User(pk=self.author.pk, username="author")])
+        Category.objects.using("replica").bulk_create(
+            [Category(pk=self.category.pk, name="news", created_by_id=self.author.pk)]
+        )
+        Post.objects.using("replica").bulk_create(
+            [
+                Post(
+                    pk=self.post.pk,
+                    title="Stale title",
+                    slug=self.post.slug,
+                    excerpt="excerpt",
+                    content="content",
+                    author_id=self.author.pk,
+                    category_id=self.category.pk,
+                )
+            ]
+        )
+
+    def title(self, client):
+        return client.get(f"/api/posts/{self.post.slug}/").json()["title"]
+
+    def test_reads_go_to_replica_until_the_client_writes(self):
+        reader, writer = APIClient(), APIClient()
+        token = LoginTokenSerializer.get_token(self.author).access_token
+        writer.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        self.assertEqual(self.title(reader), "Stale title")
+        self.assertEqual(self.title(writer), "Stale title")
+
+        response = writer.post(
+            "/api/comments/",
+            {"slug": self.post.slug, "name": "author", "email": "a@example.com", "content": "hi"},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Comment.objects.using("replica").count(), 0)
+        # Only the writer is pinned to the primary
+        self.assertEqual(self.title(reader), "Stale title")
+        # and the stale page, read just after the post changed, wasn't cached
+        self.assertEqual(self.title(writer), "Fresh title")
+
+    def test_searches_go_to_replica(self):
+        with connections["replica"].cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO api_post_fts (rowid, title, excerpt, content, category) "
+                "VALUES (%s, 'Stale title', 'excerpt', 'content', 'news')",
+                [self.post.pk],
+            )
+        response = self.client.get("/api/posts/search/", {"q": "stale"})
+        self.assertEqual([post["title"] for post in response.json()["results"]], ["Stale title"])
+        response = self.client.get("/api/posts/search/", {"q": "fresh"})
+        self.assertEqual(response.json()["results"], [])
+
+
+class RequestMetricsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.clear()
+        self.author = make_user("author")
+        self.category = Category.objects.create(name="news", created_by=self.author)
+        make_posts(self.author, self.category, 2, 1, self.author)
+
+    def test_server_timing_counts_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/posts/")
+        timing = response["Server-Timing"]
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timing)
+        self.assertRegex(timing, r"serialize;dur=[\d.]+, total;dur=[\d.]+")
+
+        # Queries an async view runs in a worker thread are counted too
+        response = self.client.get(f"/api/posts/{Post.objects.first().slug}/")
+        self.assertNotIn('desc="0 queries"', response["Server-Timing"])
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_endpoint(self):
+        self.client.get("/api/posts/")
+        self.client.get("/api/posts/")
+        self.client.get("/api/posts/missing/")
+
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer secret")
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn(
+            'api_requests_total{view="post-list-create",method="GET",status="200"} 2', body
+        )
+        self.assertIn('api_requests_total{view="post-detail",method="GET",status="404"} 1', body)
+        self.assertIn('api_request_queries_count{view="post-list-create"} 2', body)
+        self.assertIn('api_request_duration_seconds_bucket{view="post-list-create",le="+Inf"} 2', body)
+        self.assertNotIn('view="metrics"', body)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_metrics_endpoint_is_off_without_a_token(self):
+        self.client.get("/api/posts/")
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    def test_serialization_is_timed(self):
+        self.client.get("/api/posts/")
+        self.assertGreater(metrics.registry.serialize_time["post-list-create"], 0)
+
+    def test_streamed_responses_are_measured_to_the_end(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.get("/api/user/posts/")
+        self.assertEqual(metrics.registry.response_bytes, {})
+
+        body = b"".join(response.streaming_content)
+        self.assertEqual(metrics.registry.response_bytes["user-posts"], len(body))
+        self.assertEqual(metrics.registry.queries["user-posts"].sum, 1)
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs("api.metrics", "WARNING") as logs:
+            self.client.get("/api/posts/")
+        self.assertIn("Slow request GET /api/posts/ (post-list-create)", logs.output[0])
+        self.assertIn('FROM "api_post"', logs.output[0])
+
+
+class BackgroundTests(TestCase):
+    def test_runs_after_the_commit_and_logs_failures(self):
+        calls = []
+
+        def fail(*args):
+            calls.append(args)
+            raise ValueError
+
+        with self.assertLogs("api.background", "ERROR") as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                background.run_after_commit("test-background", 1, fail, 1, 2)
+                self.assertEqual(calls, [])
+            # The only worker picks up tasks in order
+            background.executor("test-background", 1).submit(lambda: None).result()
+        self.assertEqual(calls, [(1, 2)])
+        self.assertIn("fail(1, 2) failed", logs.output[0])
+
+
+class RelatedPostsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user("author")
+        self.travel = Category.objects.create(name="travel", created_by=self.author)
+        self.hike = self.write(
+            "Hiking the alpine ridge",
+            "alpine hiking trail along the ridge to the summit glacier with boots and backpack",
+        )
+        self.trek = self.write(
+            "Alpine trekking guide",
+            "trekking the alpine trail to the summit glacier, ridge views, boots and backpack",
+        )
+        cook = make_user("cook")
+        food = Category.objects.create(name="food", created_by=cook)
+        self.bread = self.write(
+            "Sourdough bread", "flour yeast starter oven crust loaf", author=cook, category=food
+        )
+
+    def write(self, title, content, author=None, category=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(
+                title=title,
+                excerpt=title,
+                content=content,
+                author=author or self.author,
+                category=category or self.travel,
+            )
+
+    def related(self, post):
+        data = self.client.get(f"/api/posts/{post.slug}/").json()
+        return [entry["slug"] for entry in data["related_posts"]]
+
+    def test_post_page_lists_related_posts(self):
+        self.assertEqual(self.related(self.hike), [self.trek.slug])
+        self.assertEqual(self.related(self.bread), [])
+        self.assertNotIn("related_posts", self.client.get("/api/posts/").json()["results"][0])
+
+        # A new post joins the lists it belongs on, and the cached page is dropped
+        near = self.write("Alpine ridge hiking", "hiking the alpine ridge trail to the glacier summit")
+        self.assertEqual(self.related(self.hike)[0], near.slug)
+        self.assertEqual(len(self.related(self.hike)), 2)
+
+        # Once edited off topic it only shares the category and author
+        with self.captureOnCommitCallbacks(execute=True):
+            near.content = near.excerpt = near.title = "Packing lists"
+            near.save()
+        self.assertEqual(self.related(self.hike), [self.trek.slug, near.slug])
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(f"/api/posts/{self.trek.slug}/")
+        self.assertEqual(len(ctx.captured_queries), 3)
+
+    def test_rebuild_command(self):
+        before = list(models.RelatedPost.objects.values_list("post", "related", "score"))
+        models.RelatedPost.objects.all().delete()
+        models.PostSignature.objects.all().delete()
+
+        call_command("rebuild_related_posts", stdout=StringIO())
+        self.assertCountEqual(
+            models.RelatedPost.objects.values_list("post", "related", "score"), before
+        )
+
+
+class MediaServingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        use_temp_media(self)
+        self.name = default_storage.save("post_images/notes.txt", ContentFile(b"0123456789"))
+
+    def get(self, name, **headers):
+        return self.client.get(f"/media/{name}", headers=headers)
+
+    def test_hashed_names_are_immutable(self):
+        self.assertRegex(self.name, rf"^post_images/notes\.{HASH}\.txt$")
+        # The same bytes reuse the file, others get their own
+        again = default_storage.save("post_images/notes.txt", ContentFile(b"0123456789"))
+        self.assertEqual(again, self.name)
+        other = default_storage.save("post_images/notes.txt", ContentFile(b"other"))
+        self.assertNotEqual(other, self.name)
+
+        response = self.get(self.name)
+        self.assertEqual(response.getvalue(), b"0123456789")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(self.get(self.name, if_none_match=response["ETag"]).status_code, 304)
+        since = self.get(self.name, if_modified_since=response["Last-Modified"])
+        self.assertEqual(since.status_code, 304)
+        self.assertEqual(since["Cache-Control"], response["Cache-Control"])
+
+        # Files stored before names were hashed must be revalidated
+        with open(os.path.join(default_storage.location, "legacy.txt"), "wb") as file:
+            file.write(b"legacy")
+        self.assertEqual(self.get("legacy.txt")["Cache-Control"], "public, no-cache")
+        self.assertEqual(self.get("missing.txt").status_code, 404)
+        self.assertEqual(self.client.post(f"/media/{self.name}").status_code, 405)
+
+    def test_range_requests(self):
+        etag = self.get(self.name)["ETag"]
+        cases = [
+            ("bytes=2-5", {}, 206, b"2345", "bytes 2-5/10"),
+            ("bytes=7-", {}, 206, b"789", "bytes 7-9/10"),
+            ("bytes=-3", {}, 206, b"789", "bytes 7-9/10"),
+            ("bytes=8-20", {}, 206, b"89", "bytes 8-9/10"),
+            ("bytes=2-5", {"if_range": etag}, 206, b"2345", "bytes 2-5/10"),
+            # Ranges of another version, several ranges or bad syntax: everything
+            ("bytes=2-5", {"if_range": '"stale"'}, 200, b"0123456789", None),
+            ("bytes=0-1,4-5", {}, 200, b"0123456789", None),
+            ("bytes=5-2", {}, 200, b"0123456789", None),
+            ("lines=1-2", {}, 200, b"0123456789", None),
+            ("bytes=10-", {}, 416, b"", "bytes */10"),
+        ]
+        for header, headers, status, body, content_range in cases:
+            with self.subTest(header, **headers):
+                response = self.get(self.name, range=header, **headers)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(response.getvalue(), body)
+                self.assertEqual(response.get("Content-Range"), content_range)
+                if status == 206:
+                    self.assertEqual(response["Content-Length"], str(len(body)))
+
+
+class CompressionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user("author")
+        category = Category.objects.create(name="news", created_by=self.author)
+        make_posts(self.author, category, 5, 1, self.author)
+
+    def test_json_is_compressed_for_clients_accepting_it(self):
+        plain = self.client.get("/api/posts/recent/")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", plain["Vary"])
+
+        with mock.patch.object(compression, "brotli", None):
+            response = self.client.get(
+                "/api/posts/recent/", headers={"accept_encoding": "gzip, br"}
+            )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response["ETag"], "W/" + plain["ETag"])
+        revalidated = self.client.get(
+            "/api/posts/recent/",
+            headers={"accept_encoding": "gzip", "if_none_match": response["ETag"]},
+        )
+        self.assertEqual(revalidated.status_code, 304)
+
+        refused = self.client.get("/api/posts/recent/", headers={"accept_encoding": "gzip;q=0"})
+        self.assertFalse(refused.has_header("Content-Encoding"))
+
+    def test_cached_responses_are_compressed_once(self):
+        with mock.patch.object(compression, "compress", wraps=compression.compress) as compress:
+            for _ in range(3):
+                self.client.get("/api/posts/recent/", headers={"accept_encoding": "gzip"})
+            post = Post.objects.first()
+            self.client.get(f"/api/posts/{post.slug}/", headers={"accept_encoding": "gzip"})
+        self.assertEqual(compress.call_count, 2)
+
+    @unittest.skipIf(compression.brotli is None, "needs the brotli package")
+    def test_brotli(self):
+        plain = self.client.get("/api/posts/recent/")
+        response = self.client.get("/api/posts/recent/", headers={"accept_encoding": "gzip, br"})
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(compression.brotli.decompress(response.content), plain.content)
+
+    def test_streamed_lists(self):
+        self.client.force_authenticate(self.author)
+        plain = b"".join(self.client.get("/api/user/posts/").streaming_content)
+        response = self.client.get("/api/user/posts/", headers={"accept_encoding": "gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), plain)
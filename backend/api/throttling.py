@@ -0,0 +1,55 @@
+"""
+Token bucket throttles for anonymous writes, kept in the default cache.
+
+Each client gets a bucket of N tokens for a DRF rate "N/period" in
+REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]: every request takes a token and
+the bucket refills at N per period, so a client may burst up to N requests
+and then sustain the rate, instead of being locked out until a fixed window
+ends. Comments are limited per client IP and, separately, per email address
+so rotating addresses doesn't get around either.
+"""
+
+import hashlib
+
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        capacity, period = self.num_requests, self.duration
+        now = self.timer()
+        tokens, updated = self.cache.get(self.key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * capacity / period)
+        self.tokens = tokens
+        if tokens < 1:
+            return False
+        self.cache.set(self.key, (tokens - 1, now), period)
+        return True
+
+    def wait(self):
+        # Seconds until the next token
+        return (1 - self.tokens) * self.duration / self.num_requests
+
+
+class CommentIPThrottle(TokenBucketThrottle):
+    scope = "comments-ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class CommentEmailThrottle(TokenBucketThrottle):
+    scope = "comments-email"
+
+    def get_cache_key(self, request, view):
+        email = str(request.data.get("email", "")).strip().lower()
+        if not email:
+            return None
+        ident = hashlib.md5(email.encode()).hexdigest()
+        return self.cache_format % {"scope": self.scope, "ident": ident}
@@ -0,0 +1,353 @@
+"""
+Streaming JSON Lines export and import of categories, posts and comments,
+behind `manage.py export_content` and `manage.py import_content`.
+
+Every line is one object with a "type" of "category", "post" or "comment".
+Rows refer to each other by natural key (usernames, category names, post
+slugs) so a dump loads into another database; users are not part of it and
+must exist on the importing side. Exports write all categories, then posts,
+then comments, reading by primary key ranges so memory stays flat on every
+database.
+
+Imports insert in batches with bulk_create, bypassing Post.save() and the
+signal handlers: SlugAllocator hands out unique slugs for each batch up
+front, and the counters, search index and response cache are rebuilt once at
+the end. A post whose slug is taken comes in under a new one; comments
+follow the post they were exported with, looked up by the slug it had in the
+dump in a temporary table (IMPORTED_POSTS), so memory stays flat however
+many posts come in. Rows referring to a missing user or category, or to a
+post not imported, are skipped and counted.
+"""
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+from .cache import GLOBAL_SCOPE, invalidate
+from .counters import rebuild_counters
+from .membership import forget_access
+from .models import SLUG_RETRIES, Category, Comment, Post, slug_usage
+from .search import get_backend
+from .utils import batches, chunked
+
+TYPES = ("category", "post", "comment")
+
+# Slug in the dump -> pk of the post imported for it, for the import's
+# connection only
+IMPORTED_POSTS = "api_imported_posts"
+
+
+def export_rows(chunk_size=2000):
+    categories = Category.objects.values(
+        "pk", "name", "description", "created_at", created_by_name=F("created_by__username")
+    )
+    for chunk in batches(chunked(categories, chunk_size), chunk_size):
+        # The members of the whole chunk in one query
+        members = defaultdict(list)
+        memberships = (
+            Category.users.through.objects.filter(category__in=[row["pk"] for row in chunk])
+            .order_by("category", "user")
+            .values_list("category", "user__username")
+        )
+        for category_id, username in memberships:
+            members[category_id].append(username)
+        for category in chunk:
+            yield {
+                "type": "category",
+                "name": category["name"],
+                "description": category["description"],
+                "created_by": category["created_by_name"],
+                "created_at": category["created_at"],
+                "users": members[category["pk"]],
+            }
+
+    posts = Post.objects.values(
+        "pk", "title", "slug", "excerpt", "content", "image", "created_at", "updated_at",
+        author_name=F("author__username"),
+        category_name=F("category__name"),
+    )
+    for post in chunked(posts, chunk_size):
+        yield {
+            "type": "post",
+            "title": post["title"],
+            "slug": post["slug"],
+            "excerpt": post["excerpt"],
+            "content": post["content"],
+            "image": post["image"] or None,
+            "author": post["author_name"],
+            "category": post["category_name"],
+            "created_at": post["created_at"],
+            "updated_at": post["updated_at"],
+        }
+
+    comments = Comment.objects.values(
+        "pk", "name", "email", "content", "created_at", post_slug=F("post__slug")
+    )
+    for comment in chunked(comments, chunk_size):
+        yield {
+            "type": "comment",
+            "post": comment["post_slug"],
+            "name": comment["name"],
+            "email": comment["email"],
+            "content": comment["content"],
+            "created_at": comment["created_at"],
+        }
+
+
+class SlugAllocator:
+    """
+    Unique slugs for a batch of new posts, with a couple of queries: one for
+    which base slugs are in use, one to check the numbered slugs about to be
+    handed out. Only bases whose numbered slug turns out to be taken get the
+    prefix scan Post.save() uses (slug_usage). Earlier batches are in the
+    table already, so each batch gets an allocator of its own.
+    """
+
+    def __init__(self):
+        # base slug -> highest suffix handed out, -1 while the base itself is free
+        self.highest = {}
+        # bases whose numbered slugs have been checked against the table
+        self.scanned = set()
+
+    def allocate(self, bases):
+        unknown = set(bases) - self.highest.keys()
+        taken = set(Post.objects.filter(slug__in=unknown).values_list("slug", flat=True))
+        for base in unknown:
+            self.highest[base] = -1
+            if base in taken:
+                self.rescan(base)
+
+        while True:
+            slugs, highest = self.propose(bases)
+            unchecked = {
+                slug: base
+                for slug, base in zip(slugs, bases)
+                if slug != base and base not in self.scanned
+            }
+            clashes = Post.objects.filter(slug__in=unchecked).values_list("slug", flat=True)
+            clashing = {unchecked[slug] for slug in clashes}
+            if not clashing:
+                self.highest.update(highest)
+                return slugs
+            for base in clashing:
+                self.rescan(base)
+
+    def propose(self, bases):
+        highest = {}
+        slugs = []
+        for base in bases:
+            n = highest.get(base, self.highest[base]) + 1
+            highest[base] = n
+            slugs.append(f"{base}-{n}" if n else base)
+        return slugs, highest
+
+    def rescan(self, base):
+        self.highest[base] = max(self.highest[base], slug_usage(base)[1])
+        self.scanned.add(base)
+
+
+def timestamp(row, key):
+    value = row.get(key)
+    return parse_datetime(value) if value else timezone.now()
+
+
+@contextmanager
+def explicit_timestamps():
+    # Let bulk_create store the dump's timestamps instead of auto_now(_add)
+    fields = [
+        field
+        for model in (Category, Post, Comment)
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    flags = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in flags:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Importer:
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.pending = {kind: [] for kind in TYPES}
+        self.counts = Counter()
+        self.categories = dict(Category.objects.values_list("name", "pk"))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {IMPORTED_POSTS} "
+                "(slug VARCHAR(255) PRIMARY KEY, post_id BIGINT NOT NULL)"
+            )
+            # Left over from an earlier import on this connection
+            cursor.execute(f"DELETE FROM {IMPORTED_POSTS}")
+
+    def add(self, row):
+        kind = row.get("type")
+        if kind not in self.pending:
+            self.counts["skipped"] += 1
+            return
+        self.pending[kind].append(row)
+        if len(self.pending[kind]) >= self.batch_size:
+            self.flush(kind)
+
+    def flush(self, kind=TYPES[-1]):
+        # Rows may refer to pending rows of the types before theirs
+        inserts = {
+            "category": self.insert_categories,
+            "post": self.insert_posts,
+            "comment": self.insert_comments,
+        }
+        for name in TYPES[: TYPES.index(kind) + 1]:
+            rows, self.pending[name] = self.pending[name], []
+            if rows:
+                with explicit_timestamps():
+                    inserts[name](rows)
+
+    def finish(self):
+        self.flush()
+        rebuild_counters()
+        get_backend().rebuild()
+        invalidate(GLOBAL_SCOPE)
+        return self.counts
+
+    def skip(self, rows, kept):
+        self.counts["skipped"] += len(rows) - len(kept)
+        return kept
+
+    def user_ids(self, usernames):
+        return dict(
+            User.objects.filter(username__in=set(usernames) - {None}).values_list(
+                "username", "pk"
+            )
+        )
+
+    def insert_categories(self, rows):
+        new = {row["name"]: row for row in rows if row["name"] not in self.categories}
+        self.counts["skipped"] += len(rows) - len(new)
+        users = self.user_ids(
+            [row.get("created_by") for row in new.values()]
+            + [name for row in new.values() for name in row.get("users", [])]
+        )
+        Category.objects.bulk_create(
+            Category(
+                name=row["name"],
+                description=row.get("description"),
+                created_by_id=users.get(row.get("created_by")),
+                created_at=timestamp(row, "created_at"),
+            )
+            for row in new.values()
+        )
+        # bulk_create doesn't set primary keys on MySQL, read them back
+        self.categories.update(
+            Category.objects.filter(name__in=new).values_list("name", "pk")
+        )
+        Category.users.through.objects.bulk_create(
+            (
+                Category.users.through(category_id=self.categories[row["name"]], user_id=users[name])
+                for row in new.values()
+                for name in row.get("users", [])
+                if name in users
+            ),
+            ignore_conflicts=True,
+        )
+        forget_access(users.values())
+        self.counts["category"] += len(new)
+
+    def insert_posts(self, rows):
+        users = self.user_ids(row.get("author") for row in rows)
+        rows = self.skip(
+            rows,
+            [
+                row
+                for row in rows
+                if row.get("author") in users and row.get("category") in self.categories
+            ],
+        )
+        bases = [row.get("slug") or slugify(row["title"]) for row in rows]
+        for attempt in range(SLUG_RETRIES):
+            slugs = SlugAllocator().allocate(bases)
+            posts = [
+                Post(
+                    title=row["title"],
+                    slug=slug,
+                    excerpt=row.get("excerpt", ""),
+                    content=row.get("content", ""),
+                    image=row.get("image"),
+                    author_id=users[row["author"]],
+                    category_id=self.categories[row["category"]],
+                    created_at=timestamp(row, "created_at"),
+                    updated_at=timestamp(row, "updated_at"),
+                )
+                for row, slug in zip(rows, slugs)
+            ]
+            try:
+                with transaction.atomic():
+                    Post.objects.bulk_create(posts)
+                break
+            except IntegrityError:
+                # Slugs taken concurrently, look them up again
+                if attempt == SLUG_RETRIES - 1:
+                    raise
+        # bulk_create doesn't set primary keys on MySQL, read them back
+        pks = dict(Post.objects.filter(slug__in=slugs).values_list("slug", "pk"))
+        self.remember_posts(
+            {row["slug"]: pks[slug] for row, slug in zip(rows, slugs) if row.get("slug")}
+        )
+        self.counts["post"] += len(rows)
+
+    def remember_posts(self, posts):
+        if not posts:
+            return
+        with connection.cursor() as cursor:
+            # A slug repeated in the dump refers to its latest post
+            placeholders = ", ".join(["%s"] * len(posts))
+            cursor.execute(
+                f"DELETE FROM {IMPORTED_POSTS} WHERE slug IN ({placeholders})", list(posts)
+            )
+            cursor.executemany(
+                f"INSERT INTO {IMPORTED_POSTS} (slug, post_id) VALUES (%s, %s)",
+                list(posts.items()),
+            )
+
+    def imported_posts(self, slugs):
+        if not slugs:
+            return {}
+        with connection.cursor() as cursor:
+            placeholders = ", ".join(["%s"] * len(slugs))
+            cursor.execute(
+                f"SELECT slug, post_id FROM {IMPORTED_POSTS} WHERE slug IN ({placeholders})",
+                list(slugs),
+            )
+            return dict(cursor.fetchall())
+
+    def insert_comments(self, rows):
+        # Not the post now holding the slug: the import may have renamed it
+        posts = self.imported_posts({row.get("post") for row in rows} - {None})
+        rows = self.skip(rows, [row for row in rows if row.get("post") in posts])
+        # Link comments to their user like CommentSerializer.create (first by pk)
+        commenters = dict(
+            User.objects.filter(email__in={row["email"] for row in rows})
+            .order_by("-pk")
+            .values_list("email", "pk")
+        )
+        Comment.objects.bulk_create(
+            Comment(
+                post_id=posts[row["post"]],
+                name=row["name"],
+                email=row["email"],
+                user_id=commenters.get(row["email"]),
+                content=row["content"],
+                created_at=timestamp(row, "created_at"),
+            )
+            for row in rows
+        )
+        self.counts["comment"] += len(rows)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     CategoryDetailView,
@@ -11,12 +12,27 @@ from .views import (
     RegisterView,
     UserListView,
     UserDetailView,
+    UserPostListView,
     DashboardView,
     UserPostsView,
     PostSearchView,
 )
 from rest_framework_simplejwt.views import TokenRefreshView
 
+if settings.ASYNC_API_VIEWS:
+    # Async variants of the hot read endpoints, for ASGI deployments
+    from . import async_views
+
+    post_detail = async_views.post_detail
+    recent_posts = async_views.recent_posts
+    post_search = async_views.post_search
+    category_detail = async_views.category_detail
+else:
+    post_detail = PostDetailView.as_view()
+    recent_posts = RecentPostListView.as_view()
+    post_search = PostSearchView.as_view()
+    category_detail = CategoryDetailView.as_view()
+
 urlpatterns = [
     path("register/", RegisterView.as_view(), name="register"),
     path("login/", LoginTokenView.as_view(), name="login"),
@@ -24,15 +40,16 @@ urlpatterns = [
     # users URLs
     path("users/", UserListView.as_view(), name="user-list"),
     path("users/<str:username>/", UserDetailView.as_view(), name="user-detail"),
+    path("users/<str:username>/posts/", UserPostListView.as_view(), name="user-post-list"),
     path("user/posts/", UserPostsView.as_view(), name="user-posts"),
     # Post URLs
     path("posts/", PostListCreateView.as_view(), name="post-list-create"),
-    path("posts/recent/", RecentPostListView.as_view(), name="recent-posts"),
-    path("posts/search/", PostSearchView.as_view(), name="post-search"),
-    path("posts/<slug:slug>/", PostDetailView.as_view(), name="post-detail"),
+    path("posts/recent/", recent_posts, name="recent-posts"),
+    path("posts/search/", post_search, name="post-search"),
+    path("posts/<slug:slug>/", post_detail, name="post-detail"),
     # Category URLs
     path("category/", CategoryListCreateView.as_view(), name="category-list-create"),
-    path("category/<str:name>/", CategoryDetailView.as_view(), name="category-detail"),
+    path("category/<str:name>/", category_detail, name="category-detail"),
     # Comment URLs
     path("comments/", CommentListCreateView.as_view(), name="comment-list-create"),
     path("comments/<int:pk>/", CommentDetailView.as_view(), name="comment-detail"),
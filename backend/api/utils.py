@@ -0,0 +1,21 @@
+"""Iteration helpers shared by bulk jobs (api.transfer, api.related)."""
+
+from itertools import islice
+
+
+def chunked(queryset, chunk_size):
+    # Keyset pages over the primary key; unlike iterator() this doesn't rely
+    # on server-side cursors, which the MySQL driver doesn't use
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).order_by("pk")[:chunk_size])
+        if not rows:
+            return
+        yield from rows
+        last_pk = rows[-1]["pk"]
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
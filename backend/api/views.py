@@ -7,6 +7,9 @@ from .serializers import (
     UserSerializer,
     RegisterSerializer,
     LoginTokenSerializer,
+    EXCERPT_FIELDS,
+    for_post_list,
+    post_list_context,
 )
 from django.contrib.auth.models import User
 from rest_framework import generics, permissions
@@ -14,15 +17,23 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.views import TokenObtainPairView
-from .models import Category, Post, Comment
+from .models import Category, Post, Comment, UserProfile
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied, NotFound
 from rest_framework.permissions import AllowAny
 from django.http import JsonResponse
-from django.db import models
+from django.shortcuts import get_object_or_404
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.decorators import permission_classes
 from rest_framework import viewsets
+from .pagination import CreatedAtCursorPagination, SearchCursorPagination
+from .search import PostSearch
+from .streaming import streaming_posts_response
+from .cache import CachedGetMixin, category_scope, post_scope, user_scope
+from .counters import received_comment_count
+from .membership import accessible_category_ids, has_access
+from .throttling import CommentEmailThrottle, CommentIPThrottle
+from . import comment_buffer
 
 
 # Register View
@@ -47,17 +58,20 @@ class LoginTokenView(TokenObtainPairView):
 
 # User Views
 class UserListView(generics.ListAPIView):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related("profile")
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
 
-class UserDetailView(generics.RetrieveUpdateAPIView):
-    queryset = User.objects.all()
+class UserDetailView(CachedGetMixin, generics.RetrieveUpdateAPIView):
+    queryset = User.objects.select_related("profile")
     serializer_class = UserSerializer
     lookup_field = "username"
     parser_classes = (MultiPartParser, FormParser)
 
+    def cache_scope(self):
+        return user_scope(self.kwargs["username"])
+
     def get_permissions(self):
         if self.request.method == "GET":
             self.permission_classes = [AllowAny]
@@ -100,9 +114,45 @@ class UserDetailView(generics.RetrieveUpdateAPIView):
         return Response(self.get_serializer(instance).data)
 
 
+class PostListMixin:
+    """Lean post listings on GET, see serializers.post_list_context."""
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method == "GET":
+            context.update(post_list_context(self.request))
+        return context
+
+
+class UserPostListView(CachedGetMixin, PostListMixin, generics.ListAPIView):
+    """A user's posts for their profile page, newest first, without content."""
+
+    serializer_class = PostSerializer
+    permission_classes = [AllowAny]
+    pagination_class = CreatedAtCursorPagination
+
+    def cache_scope(self):
+        return user_scope(self.kwargs["username"])
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if not context["fields"]:
+            context["fields"] = EXCERPT_FIELDS
+        return context
+
+    def get_queryset(self):
+        author = get_object_or_404(User.objects.only("pk"), username=self.kwargs["username"])
+        context = self.get_serializer_context()
+        posts = Post.objects.filter(author=author)
+        if "content" not in context["fields"]:
+            posts = posts.defer("content")
+        return for_post_list(posts, context)
+
+
 # Post List and Create View
-class PostListCreateView(generics.ListCreateAPIView):
+class PostListCreateView(PostListMixin, generics.ListCreateAPIView):
     serializer_class = PostSerializer
+    pagination_class = CreatedAtCursorPagination
 
     def get_permissions(self):
         if self.request.method == 'GET':
@@ -112,35 +162,42 @@ class PostListCreateView(generics.ListCreateAPIView):
         return [permission() for permission in permission_classes]
 
     def get_queryset(self):
-        return Post.objects.all()
+        return for_post_list(Post.objects.all(), self.get_serializer_context())
 
     def perform_create(self, serializer):
         category = serializer.validated_data['category']
         user = self.request.user
         
         # Check if user has access to the category
-        if not category.users.filter(id=user.id).exists():
+        if not has_access(user, category):
             raise PermissionDenied("You don't have access to this category")
         
         serializer.save(author=user)
 
 
 # Recent Blog Posts View
-class RecentPostListView(generics.ListAPIView):
+class RecentPostListView(CachedGetMixin, PostListMixin, generics.ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [AllowAny]  # Public access to recent posts
 
+    def cache_scope(self):
+        return "recent-posts"
+
     def get_queryset(self):
-        return Post.objects.order_by("-created_at")[:6]  # Get 6 most recent posts
+        posts = for_post_list(Post.objects.all(), self.get_serializer_context())
+        return posts.order_by("-created_at")[:6]  # Get 6 most recent posts
 
 
 # Post Detail View
-class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Post.objects.select_related("author")
+class PostDetailView(CachedGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Post.objects.with_related().with_related_posts()
     serializer_class = PostSerializer
     lookup_field = "slug"
     permission_classes = [AllowAny]  # Anyone can view posts
 
+    def cache_scope(self):
+        return post_scope(self.kwargs["slug"])
+
     # Restrict update and delete permissions to the post author
     def get_permissions(self):
         if self.request.method in ["PUT", "PATCH", "DELETE"]:
@@ -171,8 +228,13 @@ class IsPostAuthor(permissions.BasePermission):
 
 
 # Category List and Create View
-class CategoryListCreateView(generics.ListCreateAPIView):
+class CategoryListCreateView(CachedGetMixin, generics.ListCreateAPIView):
     serializer_class = CategorySerializer
+    # is_creator and for_blog_form depend on who is asking
+    cache_per_user = True
+
+    def cache_scope(self):
+        return "categories"
 
     def get_permissions(self):
         """
@@ -192,7 +254,9 @@ class CategoryListCreateView(generics.ListCreateAPIView):
         
         if is_blog_form and self.request.user.is_authenticated:
             # Return only categories the user has access to
-            return Category.objects.filter(users=self.request.user).distinct()
+            return Category.objects.filter(
+                pk__in=accessible_category_ids(self.request.user)
+            ).order_by('name')
         
         # For public viewing, return all categories
         return Category.objects.all().order_by('name')
@@ -203,7 +267,7 @@ class CategoryListCreateView(generics.ListCreateAPIView):
         
         if existing_category:
             # Add user to existing category's users if not already added
-            if request.user not in existing_category.users.all():
+            if not has_access(request.user, existing_category):
                 existing_category.users.add(request.user)
                 return Response({
                     'id': existing_category.id,
@@ -232,29 +296,65 @@ class CategoryListCreateView(generics.ListCreateAPIView):
 
 
 # Category Detail, Update, and Delete View
-class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CategoryDetailView(CachedGetMixin, PostListMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Category.objects.all()
     serializer_class = CategoryDetailSerializer
     lookup_field = "name"
+    pagination_class = CreatedAtCursorPagination
+
+    def cache_scope(self):
+        return category_scope(self.kwargs["name"])
 
     def get_permissions(self):
         if self.request.method == "GET":  # Allow unauthenticated GET requests
             return [AllowAny()]
         return [IsAuthenticated()]  # Require authentication for PUT, PATCH, DELETE
 
+    def retrieve(self, request, *args, **kwargs):
+        category = self.get_object()
+
+        # Only serialize one page of the category's posts
+        context = self.get_serializer_context()
+        context["posts"] = self.paginate_queryset(
+            for_post_list(category.posts.all(), context)
+        )
+        data = self.get_serializer(category, context=context).data
+
+        data["next"] = self.paginator.get_next_link()
+        data["previous"] = self.paginator.get_previous_link()
+        return Response(data)
+
 
 # Comment Views
 class CommentListCreateView(generics.ListCreateAPIView):
     serializer_class = CommentSerializer
     permission_classes = [AllowAny]
+    pagination_class = CreatedAtCursorPagination
+
+    def get_throttles(self):
+        # Only new comments are rate limited
+        if self.request.method == "POST":
+            return [CommentIPThrottle(), CommentEmailThrottle()]
+        return super().get_throttles()
+
+    def create(self, request, *args, **kwargs):
+        if not comment_buffer.enabled():
+            return super().create(request, *args, **kwargs)
+        # Queued and written in a batch, see api.comment_buffer
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.instance = Comment(**serializer.validated_data)
+        comment_buffer.enqueue(serializer.instance)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
     def get_queryset(self):
-        queryset = Comment.objects.all().order_by("-created_at")
+        queryset = Comment.objects.select_related("post", "user__profile").order_by(
+            "-created_at"
+        )
         
         # If user is authenticated, only return comments on their posts
         if self.request.user.is_authenticated:
-            user_posts = Post.objects.filter(author=self.request.user)
-            return queryset.filter(post__in=user_posts)
+            return queryset.on_posts_of(self.request.user)
         
         # For unauthenticated users, return empty queryset
         return Comment.objects.none()
@@ -264,10 +364,12 @@ class CommentListCreateView(generics.ListCreateAPIView):
         
         # Add total_user_comments if user is authenticated
         if request.user.is_authenticated:
-            user_posts = Post.objects.filter(author=request.user)
-            total_user_comments = Comment.objects.filter(post__in=user_posts).count()
+            # The counter the dashboard shows, not a COUNT over the join
+            total_user_comments = received_comment_count(request.user)
             response.data = {
-                'comments': response.data,
+                'comments': response.data['results'],
+                'next': response.data['next'],
+                'previous': response.data['previous'],
                 'total_user_comments': total_user_comments
             }
         
@@ -275,7 +377,7 @@ class CommentListCreateView(generics.ListCreateAPIView):
 
 
 class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Comment.objects.select_related("post")
+    queryset = Comment.objects.select_related("post", "user__profile")
     serializer_class = CommentSerializer
     permission_classes = [AllowAny]
 
@@ -286,20 +388,24 @@ class DashboardView(generics.RetrieveAPIView):
     def get(self, request):
         user = request.user
 
-        # Total posts created by the user
-        posts = Post.objects.filter(author=user)
-        total_posts = posts.count()
-
-        # Total comments for all posts created by the user
-        total_comments = Comment.objects.filter(post__in=posts).count()
+        # Totals come from the counters maintained in api.counters
+        profile = UserProfile.objects.filter(user=user).first()
+        if profile is not None:
+            total_posts = profile.post_count
+        else:
+            # Users created without a profile, e.g. by createsuperuser
+            total_posts = Post.objects.filter(author=user).count()
+        total_comments = received_comment_count(user, profile)
 
         # Latest 4 posts
-        recent_posts = posts.order_by("-created_at")[:4]
+        recent_posts = Post.objects.filter(author=user).order_by("-created_at")[:4]
 
         # Recent 4 comments for all posts created by the user
-        recent_comments = Comment.objects.filter(post__in=posts).order_by(
-            "-created_at"
-        )[:4]
+        recent_comments = (
+            Comment.objects.on_posts_of(user)
+            .select_related("post")
+            .order_by("-created_at", "-id")[:4]
+        )
 
         # Prepare recent posts with their individual comment count
         posts_data = [
@@ -307,7 +413,7 @@ class DashboardView(generics.RetrieveAPIView):
                 "title": post.title,
                 "created_at": post.created_at,
                 "excerpt": post.excerpt,
-                "comments_count": post.comments.count(),
+                "comments_count": post.comment_count,
                 "slug": post.slug,
             }
             for post in recent_posts
@@ -341,22 +447,24 @@ class UserPostsView(APIView):
 
     def get(self, request):
         user = request.user  # Get the authenticated user
-        posts = Post.objects.filter(author=user)  # Filter posts by the user
-        serializer = PostSerializer(posts, many=True)  # Serialize the posts
-        return Response(serializer.data)
+        context = post_list_context(request)
+        posts = for_post_list(Post.objects.filter(author=user), context)  # Filter posts by the user
+        # Every post, so stream them instead of building the whole list
+        return streaming_posts_response(posts, context)
 
 
-class PostSearchView(generics.ListAPIView):
+class PostSearchView(PostListMixin, generics.ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [AllowAny]
+    pagination_class = SearchCursorPagination
 
-    def get_queryset(self):
-        query = self.request.query_params.get("q", "")
-        if query:
-            return Post.objects.filter(models.Q(title__icontains=query)).order_by(
-                "-created_at"
-            )
-        return Post.objects.none()
+    def list(self, request, *args, **kwargs):
+        # Ranked by relevance, see api.search
+        posts = for_post_list(Post.objects.all(), self.get_serializer_context())
+        search = PostSearch(request.query_params.get("q", ""), posts)
+        page = self.paginate_queryset(search)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -386,12 +494,12 @@ class CategoryViewSet(viewsets.ModelViewSet):
         return Category.objects.filter(user=self.request.user)
 
 
-class PostListView(generics.ListAPIView):
+class PostListView(PostListMixin, generics.ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [AllowAny]  # Allow public access for viewing posts
     
     def get_queryset(self):
-        queryset = Post.objects.all().order_by('-created_at')
+        queryset = for_post_list(Post.objects.all(), self.get_serializer_context()).order_by('-created_at')
         category = self.request.query_params.get('category', None)
         
         if category:
@@ -3,6 +3,14 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Served this way, the hot read endpoints (post detail, recent posts, search
+and category detail) use the async views in api.async_views. Run it with any
+ASGI server, for example:
+
+    uvicorn backend.asgi:application --workers 4
+
+Set ASYNC_API_VIEWS=false to serve the sync DRF views over ASGI instead.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -12,5 +20,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+os.environ.setdefault('ASYNC_API_VIEWS', 'true')
 
 application = get_asgi_application()
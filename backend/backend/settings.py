@@ -49,25 +49,72 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.metrics.MetricsMiddleware",
+    "api.compression.CompressionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "api.replicas.ReplicaMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.ClaimsJWTAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # Token buckets for new comments, per client IP and per email
+    # (api.throttling)
+    "DEFAULT_THROTTLE_RATES": {
+        "comments-ip": os.getenv("COMMENT_RATE_PER_IP", "30/min"),
+        "comments-email": os.getenv("COMMENT_RATE_PER_EMAIL", "10/min"),
+    },
+}
+
+SIMPLE_JWT = {
+    "TOKEN_REFRESH_SERIALIZER": "api.serializers.ClaimsTokenRefreshSerializer",
 }
 
+# Seconds a worker may keep trusting tokens after they are revoked
+# (api.authentication)
+AUTH_REVOCATION_TTL = int(os.getenv("AUTH_REVOCATION_TTL", "30"))
+
+# Response cache for the public read endpoints (api.cache). The in-process
+# cache suits a single worker; set REDIS_URL (needs the redis package) to share
+# it between workers
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Seconds a cached API response is kept, invalidation aside
+API_CACHE_TIMEOUT = int(os.getenv("API_CACHE_TIMEOUT", "300"))
+
+# Default page size for the cursor-paginated list endpoints (api.pagination)
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "20"))
+
+# Posts read and serialized at a time by the streamed lists (api.streaming)
+API_STREAM_CHUNK_SIZE = int(os.getenv("API_STREAM_CHUNK_SIZE", "100"))
+
+# Route the hot read endpoints to the async views in api.async_views;
+# backend/asgi.py turns this on
+ASYNC_API_VIEWS = os.getenv("ASYNC_API_VIEWS", "false").lower() == "true"
+
 
 ROOT_URLCONF = "backend.urls"
 
@@ -93,6 +140,8 @@ WSGI_APPLICATION = "backend.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Connections are kept open for DB_CONN_MAX_AGE seconds and checked before
+# each request reuses them
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.mysql",
@@ -102,13 +151,56 @@ DATABASES = {
         "HOST": os.getenv("DB_HOST"),
         "PORT": os.getenv("DB_PORT"),
         "OPTIONS": {"init_command": "SET sql_mode='STRICT_TRANS_TABLES'"},
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Read replicas of the primary, comma-separated hosts with the same name,
+# user and password. API reads go to them, see api.replicas
+for number, host in enumerate(filter(None, os.getenv("DB_REPLICA_HOSTS", "").split(",")), 1):
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "HOST": host.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+
+# Set DB_ENGINE=sqlite to run against a local SQLite file instead (tests,
+# benchmarks, local development without MySQL)
+if os.getenv("DB_ENGINE") == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.getenv("DB_NAME") or BASE_DIR / "db.sqlite3",
+        }
+    }
+
+DATABASE_ROUTERS = ["api.replicas.ReplicaRouter"]
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+# Upper bound on replication lag: how long a client reads from the primary
+# after writing through the API
+DATABASE_REPLICA_LAG = int(os.getenv("DB_REPLICA_LAG", "5"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
+# Hasher for new passwords: pbkdf2 (default), argon2 (needs argon2-cffi) or
+# bcrypt (needs bcrypt). The others still verify existing hashes, which are
+# rehashed with the chosen one on the user's next login
+PASSWORD_HASHER_CLASSES = {
+    "pbkdf2": "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "argon2": "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "bcrypt": "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+}
+PASSWORD_HASHER = os.getenv("PASSWORD_HASHER", "pbkdf2")
+PASSWORD_HASHERS = [
+    PASSWORD_HASHER_CLASSES[PASSWORD_HASHER],
+    *(path for name, path in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -141,9 +233,43 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
 STATIC_URL = "static/"
-MEDIA_URL = "/media/"
+MEDIA_URL = os.getenv("MEDIA_URL", "/media/")
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Media files are saved under content-hashed names (api.media) and served
+# with a MEDIA_CACHE_MAX_AGE immutable Cache-Control. SERVE_MEDIA serves them
+# from Django at MEDIA_URL, for development or as the origin of a CDN that
+# MEDIA_URL points at (https://cdn.example.com/media/)
+SERVE_MEDIA = os.getenv("SERVE_MEDIA", str(DEBUG)).lower() == "true"
+MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", str(365 * 24 * 60 * 60)))
+
+STORAGES = {
+    "default": {"BACKEND": "api.media.HashedMediaStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# Queue new comments and write them in batches of this many (api.comment_buffer);
+# 0 writes each one as it comes. Leftovers are written every
+# COMMENT_BUFFER_INTERVAL seconds
+COMMENT_BUFFER_SIZE = int(os.getenv("COMMENT_BUFFER_SIZE", "0"))
+COMMENT_BUFFER_INTERVAL = float(os.getenv("COMMENT_BUFFER_INTERVAL", "1"))
+
+# Related posts kept per post (api.related), and the background threads
+# updating them after post writes; 0 updates them at the commit
+RELATED_POSTS = int(os.getenv("RELATED_POSTS", "5"))
+RELATED_POSTS_WORKERS = int(os.getenv("RELATED_POSTS_WORKERS", "1"))
+
+# Per-request instrumentation (api.metrics): Server-Timing headers, a log of
+# requests slower than SLOW_REQUEST_MS with their SQL, and Prometheus metrics
+# at /metrics, which needs "Authorization: Bearer <METRICS_TOKEN>" and is off
+# while METRICS_TOKEN is unset
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "500"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Background threads rendering resized images (api.images); 0 renders inline
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,16 @@
+"""
+Settings for the test suite, selected by `manage.py test`.
+
+Adds a second database, "replica", that ReplicaRoutingTests use in place of
+a read replica. It is a database of its own (not a TEST MIRROR of the
+default), so what a request reads shows where it was routed. It is left out
+of DATABASE_REPLICAS; tests that read from it list it there themselves.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+DATABASES = {
+    **DATABASES,
+    "replica": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"},
+}
@@ -0,0 +1,143 @@
+"""
+Load test of the hot read endpoints served over WSGI (sync DRF views) and
+over ASGI (api.async_views).
+
+Seeds a SQLite database with the corpus of search_benchmark.py, starts
+gunicorn on backend.wsgi and uvicorn on backend.asgi with the same number of
+worker processes, and hits each endpoint from concurrent keep-alive clients:
+
+    python benchmarks/asgi_benchmark.py --posts 20000 --clients 64
+
+Needs gunicorn and uvicorn[standard] installed. Django's ASGI handler costs
+more per request than WSGI, so the async views only come out ahead when
+requests spend their time waiting, e.g. on a remote database or cache; run
+the servers on their own cores, apart from the clients.
+
+The response cache is disabled by default (--cache-timeout 0) so every
+request reaches the database; pass a timeout to measure cache hits instead.
+"""
+
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from search_benchmark import BACKEND_DIR, generate, vocabulary
+
+SERVERS = {
+    "wsgi": "gunicorn backend.wsgi:application --bind 127.0.0.1:{port} "
+    "--workers {workers} --threads {threads} --log-level warning",
+    "asgi": "uvicorn backend.asgi:application --port {port} "
+    "--workers {workers} --log-level warning --no-access-log",
+}
+
+
+def start_server(kind, port, args):
+    command = SERVERS[kind].format(port=port, workers=args.workers, threads=args.threads)
+    env = {
+        **os.environ,
+        "DB_ENGINE": "sqlite",
+        "DB_NAME": args.db,
+        "API_CACHE_TIMEOUT": str(args.cache_timeout),
+        "CORS_ORIGINS": os.environ.get("CORS_ORIGINS", "http://localhost:5173"),
+    }
+    server = subprocess.Popen(command.split(), cwd=BACKEND_DIR, env=env)
+    for _ in range(100):
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/api/posts/recent/")
+            connection.getresponse().read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"{kind} server did not start: {command}")
+
+
+def load(port, path, clients, duration):
+    """Run `clients` keep-alive clients for `duration` seconds; return latencies."""
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        timings = []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            timings.append(time.perf_counter() - started)
+            if response.status != 200:
+                errors.append(response.status)
+        latencies.extend(timings)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise RuntimeError(f"{path}: {len(errors)} failed requests, e.g. {errors[0]}")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare WSGI and ASGI read throughput")
+    parser.add_argument("--posts", type=int, default=20000)
+    parser.add_argument("--db", default="/tmp/blogsphere-asgi-bench.sqlite3")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="Threads per WSGI worker")
+    parser.add_argument("--cache-timeout", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ["DB_NAME"] = args.db
+
+    import django
+
+    django.setup()
+    from django.core.management import call_command
+    from api.models import Category, Post
+
+    words = vocabulary(4000)
+    call_command("migrate", verbosity=0)
+    generate(args.posts, words)
+
+    post = Post.objects.order_by("-id").first()
+    category = Category.objects.order_by("id").first()
+    paths = {
+        "recent": "/api/posts/recent/",
+        "detail": f"/api/posts/{post.slug}/",
+        "search": f"/api/posts/search/?q={words[800]}",
+        "category": f"/api/category/{category.name}/",
+    }
+
+    print(
+        f"{Post.objects.count()} posts, {args.clients} clients, {args.workers} workers,"
+        f" {args.duration:g}s per endpoint, cache timeout {args.cache_timeout}s"
+    )
+    for port, kind in enumerate(SERVERS, start=8701):
+        server = start_server(kind, port, args)
+        try:
+            for name, path in paths.items():
+                latencies = sorted(load(port, path, args.clients, args.duration))
+                p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+                print(
+                    f"{kind:>5} {name:>9}: {len(latencies) / args.duration:8.1f} req/s"
+                    f"   p50 {statistics.median(latencies) * 1000:8.2f} ms"
+                    f"   p99 {p99 * 1000:8.2f} ms"
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Benchmark for posting comments (POST /api/comments/).
+
+Posts comments through the full middleware and view stack, one after the
+other in one process, spread over a few posts and commenters, and reports
+sustained comments per second with each comment written as it comes and
+with api.comment_buffer batching them:
+
+    python benchmarks/comment_benchmark.py --comments 2000 --buffer 50
+
+The throttles are lifted for the run.
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from unittest import mock
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+os.environ["DB_ENGINE"] = "sqlite"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark comment throughput")
+    parser.add_argument("--comments", type=int, default=2000)
+    parser.add_argument("--buffer", type=int, default=50, help="Batch size for the buffered run")
+    parser.add_argument("--db", default="/tmp/blogsphere-comment-bench.sqlite3")
+    args = parser.parse_args()
+
+    os.environ["DB_NAME"] = args.db
+    Path(args.db).unlink(missing_ok=True)
+
+    import django
+
+    django.setup()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import override_settings
+    from api import comment_buffer
+    from api.models import Category, Comment, Post, UserProfile
+    from api.throttling import TokenBucketThrottle
+
+    call_command("migrate", verbosity=0)
+    author = User.objects.create_user(username="author", email="author@example.com")
+    UserProfile.objects.create(user=author)
+    category = Category.objects.create(name="bench", created_by=author)
+    slugs = [
+        Post.objects.create(
+            title=f"Post {i}", excerpt="e", content="c", author=author, category=category
+        ).slug
+        for i in range(10)
+    ]
+    for i in range(20):
+        User.objects.create_user(username=f"reader{i}", email=f"reader{i}@example.com")
+
+    client = Client(SERVER_NAME="localhost")
+    unlimited = {"comments-ip": "1000000/s", "comments-email": "1000000/s"}
+
+    print(f"{args.comments} comments per run, one process")
+    for label, size in (("direct", 0), (f"buffered ({args.buffer})", args.buffer)):
+        with override_settings(
+            ALLOWED_HOSTS=["localhost"], COMMENT_BUFFER_SIZE=size, COMMENT_BUFFER_INTERVAL=0
+        ), mock.patch.object(TokenBucketThrottle, "THROTTLE_RATES", unlimited):
+            before = Comment.objects.count()
+            started = time.perf_counter()
+            for i in range(args.comments):
+                response = client.post(
+                    "/api/comments/",
+                    {
+                        "slug": slugs[i % len(slugs)],
+                        "name": "reader",
+                        "email": f"reader{i % 40}@example.com",
+                        "content": f"comment {i}",
+                    },
+                )
+                assert response.status_code in (201, 202), response.content
+            comment_buffer.flush()
+            elapsed = time.perf_counter() - started
+            assert Comment.objects.count() - before == args.comments
+        print(
+            f"{label:>14}: {args.comments / elapsed:8.1f} comments/s"
+            f"   {elapsed / args.comments * 1000:6.2f} ms/comment"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Benchmark of every route in api/urls.py, with a baseline to catch regressions.
+
+Fills a fresh SQLite database with a synthetic blog, sends each route a fixed
+request through the full middleware and view stack with Django's test client,
+and reports per route p50 and p99 latency, SQL queries per request and response
+bytes, streamed bodies included:
+
+    python benchmarks/endpoint_benchmark.py                     # check
+    python benchmarks/endpoint_benchmark.py --save              # re-record
+
+Without --save the results are compared against the baseline and the run
+exits with status 1 when any route makes more queries or returns noticeably
+more bytes than before. The baseline in the repository (endpoint_baseline.json)
+holds queries and bytes only, which don't depend on the machine; re-record it
+with --save when a change is meant to alter them. Latency does depend on the
+machine: to check it too, record a local baseline on the base branch with
+--save --latency --baseline some/local.json and compare against that file.
+
+Writes run inside a transaction that is rolled back, so every request sees the
+same data. The response cache is cleared before every request so reads are
+measured on the database path; pass --warm to measure cache hits instead.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+os.environ["DB_ENGINE"] = "sqlite"
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "endpoint_baseline.json"
+WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor".split()
+
+
+def generate(options):
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from api.counters import rebuild_counters
+    from api.models import Category, Comment, Post, UserProfile
+    from api.search import get_backend
+
+    rng = random.Random(options["seed"])
+
+    def text(count):
+        return " ".join(rng.choices(WORDS, k=count))
+
+    password = make_password("bench-pass-123")
+    users = User.objects.bulk_create(
+        User(username=f"user{i}", email=f"user{i}@example.com", password=password)
+        for i in range(options["users"])
+    )
+    UserProfile.objects.bulk_create(UserProfile(user=user, bio=text(12)) for user in users)
+    categories = Category.objects.bulk_create(
+        Category(name=f"category{i}", created_by=users[i % len(users)])
+        for i in range(options["categories"])
+    )
+    Category.users.through.objects.bulk_create(
+        Category.users.through(category=category, user_id=category.created_by_id)
+        for category in categories
+    )
+    posts = Post.objects.bulk_create(
+        Post(
+            title=text(6),
+            excerpt=text(20),
+            content=text(400),
+            slug=f"post-{i}",
+            author=users[i % len(users)],
+            category=categories[i % len(categories)],
+        )
+        for i in range(options["posts"])
+    )
+    comments = []
+    for post in posts:
+        for _ in range(options["comments"]):
+            commenter = rng.choice(users)
+            comments.append(
+                Comment(
+                    post=post,
+                    name=commenter.username,
+                    email=commenter.email,
+                    user=commenter,
+                    content=text(25),
+                )
+            )
+    Comment.objects.bulk_create(comments, batch_size=5000)
+    # bulk_create skips the signals that keep counters and the index current
+    rebuild_counters()
+    get_backend().rebuild()
+
+
+def image_upload():
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new("RGB", (640, 480), "teal").save(buffer, "JPEG")
+    return SimpleUploadedFile("bench.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+
+def routes(refresh_token):
+    """(url name, method, path, data as a callable or None, format, needs login)"""
+    from api.models import Category, Comment
+
+    # Objects of user0, who the logged in requests are made as
+    comment = Comment.objects.filter(post__slug="post-0").order_by("pk").first().pk
+    post = {
+        "title": "Benchmark post",
+        "excerpt": "excerpt",
+        "content": " ".join(WORDS * 20),
+        "category_id": Category.objects.get(name="category0").pk,
+    }
+    new_comment = {
+        "slug": "post-0", "name": "reader", "email": "reader@example.com", "content": "hi"
+    }
+    return [
+        ("register", "POST", "/api/register/", lambda: {
+            "username": "newcomer", "email": "newcomer@example.com",
+            "password": "bench-pass-123", "first_name": "New", "last_name": "Comer",
+            "bio": "bio", "photo": image_upload(),
+        }, "multipart", False),
+        ("login", "POST", "/api/login/",
+         lambda: {"username": "user0", "password": "bench-pass-123"}, "json", False),
+        ("token_refresh", "POST", "/api/token/refresh/",
+         lambda: {"refresh": refresh_token}, "json", False),
+        ("user-list", "GET", "/api/users/", None, None, True),
+        ("user-detail", "GET", "/api/users/user0/", None, None, False),
+        ("user-post-list", "GET", "/api/users/user0/posts/", None, None, False),
+        ("user-posts", "GET", "/api/user/posts/", None, None, True),
+        ("post-list-create", "GET", "/api/posts/", None, None, False),
+        ("post-list-create", "GET", "/api/posts/?expand=comments", None, None, False),
+        ("post-list-create", "POST", "/api/posts/",
+         lambda: {**post, "image": image_upload()}, "multipart", True),
+        ("recent-posts", "GET", "/api/posts/recent/", None, None, False),
+        ("post-search", "GET", f"/api/posts/search/?q={WORDS[0]}", None, None, False),
+        ("post-detail", "GET", "/api/posts/post-0/", None, None, False),
+        ("post-detail", "PATCH", "/api/posts/post-0/",
+         lambda: {"title": "Edited title"}, "json", True),
+        ("post-detail", "DELETE", "/api/posts/post-0/", None, None, True),
+        ("category-list-create", "GET", "/api/category/", None, None, False),
+        ("category-list-create", "POST", "/api/category/",
+         lambda: {"name": "brand-new"}, "json", True),
+        ("category-detail", "GET", "/api/category/category0/", None, None, False),
+        ("comment-list-create", "GET", "/api/comments/", None, None, True),
+        ("comment-list-create", "POST", "/api/comments/", lambda: new_comment, "json", False),
+        ("comment-detail", "GET", f"/api/comments/{comment}/", None, None, False),
+        ("comment-detail", "PATCH", f"/api/comments/{comment}/",
+         lambda: {"content": "edited"}, "json", False),
+        ("comment-detail", "DELETE", f"/api/comments/{comment}/", None, None, False),
+        ("dashboard", "GET", "/api/dashboard/", None, None, True),
+    ]
+
+
+def percentile(timings, fraction):
+    timings = sorted(timings)
+    return timings[max(int(len(timings) * fraction + 0.5) - 1, 0)]
+
+
+def measure(client, method, path, data, format, requests, warm):
+    from django.core.cache import cache
+    from django.db import connection, transaction
+    from django.test.utils import CaptureQueriesContext
+
+    timings, queries, sizes = [], [], []
+    for _ in range(requests):
+        if not warm:
+            cache.clear()
+        with transaction.atomic(), CaptureQueriesContext(connection) as captured:
+            payload = data() if data else None
+            started = time.perf_counter()
+            if method == "GET":
+                response = client.get(path)
+            else:
+                response = getattr(client, method.lower())(path, payload, format=format)
+            content = (
+                b"".join(response.streaming_content) if response.streaming else response.content
+            )
+            timings.append((time.perf_counter() - started) * 1000)
+            transaction.set_rollback(True)
+        if response.status_code >= 400:
+            raise SystemExit(f"{method} {path} answered {response.status_code}: {content[:300]}")
+        queries.append(len(captured.captured_queries))
+        sizes.append(len(content))
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p99_ms": round(percentile(timings, 0.99), 3),
+        "queries": max(queries),
+        "bytes": max(sizes),
+    }
+
+
+def regressions(baseline, results, args):
+    found = []
+    for route, new in results.items():
+        old = baseline.get(route)
+        if old is None:
+            continue
+        if new["queries"] > old["queries"]:
+            found.append(f"{route}: {old['queries']} -> {new['queries']} queries")
+        if new["bytes"] > old["bytes"] * (1 + args.bytes_tolerance):
+            found.append(f"{route}: {old['bytes']} -> {new['bytes']} bytes")
+        # p99 rests on the few slowest requests, so it gets twice the slack
+        limits = (("p50_ms", args.latency_tolerance), ("p99_ms", 2 * args.latency_tolerance))
+        for key, tolerance in limits:
+            if key not in old:
+                continue
+            slower = new[key] - old[key]
+            if new[key] > old[key] * (1 + tolerance) and slower > args.min_ms:
+                found.append(f"{route}: {key} {old[key]:.2f} -> {new[key]:.2f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every API route")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--comments", type=int, default=10, help="Comments per post")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per route")
+    parser.add_argument("--warm", action="store_true", help="Keep the response cache")
+    parser.add_argument("--db", default="/tmp/blogsphere-endpoint-bench.sqlite3")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="Write the baseline")
+    parser.add_argument("--latency", action="store_true",
+                        help="Save latencies in the baseline too, for a local baseline")
+    parser.add_argument("--latency-tolerance", type=float, default=0.3,
+                        help="Allowed relative slowdown of p50 and p99")
+    parser.add_argument("--min-ms", type=float, default=2.0,
+                        help="Slowdowns smaller than this many ms are noise")
+    parser.add_argument("--bytes-tolerance", type=float, default=0.05)
+    args = parser.parse_args()
+
+    os.environ["DB_NAME"] = args.db
+    Path(args.db).unlink(missing_ok=True)
+
+    import django
+
+    django.setup()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+    from rest_framework.test import APIClient
+    from api import urls
+    from api.serializers import LoginTokenSerializer
+    from api.throttling import TokenBucketThrottle
+
+    dataset = {
+        key: getattr(args, key) for key in ("users", "categories", "posts", "comments", "seed")
+    }
+    call_command("migrate", verbosity=0)
+    started = time.perf_counter()
+    generate(dataset)
+    print(f"dataset {dataset} built in {time.perf_counter() - started:.1f}s")
+
+    token = LoginTokenSerializer.get_token(User.objects.get(username="user0"))
+    anonymous, logged_in = APIClient(), APIClient()
+    logged_in.credentials(HTTP_AUTHORIZATION=f"Bearer {token.access_token}")
+
+    cases = routes(str(token))
+    missing = {pattern.name for pattern in urls.urlpatterns} - {case[0] for case in cases}
+    if missing:
+        raise SystemExit(f"No benchmark case for routes: {', '.join(sorted(missing))}")
+
+    media_root = tempfile.mkdtemp()
+    unlimited = {"comments-ip": "1000000/s", "comments-email": "1000000/s"}
+    results = {}
+    try:
+        with override_settings(
+            ALLOWED_HOSTS=["testserver"],
+            MEDIA_ROOT=media_root,
+            IMAGE_WORKERS=0,
+            COMMENT_BUFFER_SIZE=0,
+            SLOW_REQUEST_MS=10**9,
+        ), mock.patch.object(TokenBucketThrottle, "THROTTLE_RATES", unlimited):
+            header = f"{'route':<46}{'p50 ms':>9}{'p99 ms':>9}{'queries':>9}{'bytes':>10}"
+            print(header)
+            for name, method, path, data, format, login in cases:
+                client = logged_in if login else anonymous
+                route = f"{method} {path}"
+                result = measure(client, method, path, data, format, args.requests, args.warm)
+                results[route] = result
+                print(
+                    f"{route:<46}{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                    f"{result['queries']:>9}{result['bytes']:>10}"
+                )
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
+
+    if args.save:
+        saved = results
+        if not args.latency:
+            saved = {
+                route: {key: result[key] for key in ("queries", "bytes")}
+                for route, result in results.items()
+            }
+        recorded = {"dataset": dataset, "warm": args.warm, "routes": saved}
+        args.baseline.write_text(json.dumps(recorded, indent=2) + "\n")
+        print(f"baseline saved to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}; run with --save to record one")
+        return
+    baseline = json.loads(args.baseline.read_text())
+    if (baseline["dataset"], baseline["warm"]) != (dataset, args.warm):
+        raise SystemExit("The baseline was recorded with other options; re-record it with --save")
+    found = regressions(baseline["routes"], results, args)
+    if found:
+        print("\nRegressions against the baseline:")
+        print("\n".join(f"  {line}" for line in found))
+        sys.exit(1)
+    print("\nNo regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark for logins (api.serializers.LoginTokenSerializer).
+
+Times logins per second on one core for each password hasher that is
+installed, with the current serializer and with the old validate(), which
+checked the password and then authenticated it a second time:
+
+    python benchmarks/login_benchmark.py --logins 20
+
+argon2 needs the argon2-cffi package and bcrypt the bcrypt package; missing
+ones are skipped.
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+os.environ["DB_ENGINE"] = "sqlite"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark login throughput")
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--db", default="/tmp/blogsphere-login-bench.sqlite3")
+    args = parser.parse_args()
+
+    os.environ["DB_NAME"] = args.db
+
+    import django
+
+    django.setup()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+    from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+    from api.serializers import LoginTokenSerializer
+
+    class OldLoginSerializer(LoginTokenSerializer):
+        def validate(self, attrs):
+            user = User.objects.get(username=attrs["username"])
+            if not user.check_password(attrs["password"]):
+                raise AssertionError("wrong password")
+            return TokenObtainPairSerializer.validate(self, attrs)
+
+    call_command("migrate", verbosity=0)
+    credentials = {"username": "bench", "password": "bench-password-1"}
+
+    print(f"{args.logins} logins per run, one process")
+    for name, path in settings.PASSWORD_HASHER_CLASSES.items():
+        hashers = [path, *settings.PASSWORD_HASHERS]
+        with override_settings(PASSWORD_HASHERS=hashers):
+            User.objects.filter(username="bench").delete()
+            try:
+                User.objects.create_user(email="bench@example.com", **credentials)
+            except ValueError as error:
+                print(f"{name:>7}: skipped ({error})")
+                continue
+
+            for label, serializer_class in (("old", OldLoginSerializer), ("new", LoginTokenSerializer)):
+                started = time.perf_counter()
+                for _ in range(args.logins):
+                    serializer = serializer_class(data=credentials)
+                    serializer.is_valid(raise_exception=True)
+                elapsed = time.perf_counter() - started
+                print(
+                    f"{name:>7} {label}: {args.logins / elapsed:7.2f} logins/s"
+                    f"   {elapsed / args.logins * 1000:7.1f} ms/login"
+                )
+
+
+if __name__ == "__main__":
+    main()
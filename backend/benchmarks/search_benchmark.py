@@ -0,0 +1,129 @@
+"""
+Benchmark for /api/posts/search/ (api.search).
+
+Builds a synthetic corpus in a SQLite database, then times ranked first-page
+searches through api.search against the old title__icontains scan:
+
+    python benchmarks/search_benchmark.py --posts 1000000
+
+Words are drawn from a Zipf distribution so the queries cover common, mid
+frequency and rare terms. The database is reused between runs when it
+already holds enough posts, so only the first run pays for generation.
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+os.environ["DB_ENGINE"] = "sqlite"
+
+SYLLABLES = "ka lo mi ra tu sen vel dor pia nex qua bri tol zan fe gu".split()
+
+
+def vocabulary(size):
+    words = ("".join(parts) for parts in itertools.product(SYLLABLES, repeat=3))
+    return list(itertools.islice(words, size))
+
+
+def generate(posts, words, batch_size=5000):
+    from django.contrib.auth.models import User
+    from api.models import Category, Post
+    from api.search import get_backend
+
+    author, _ = User.objects.get_or_create(username="bench", email="bench@example.com")
+    categories = [
+        Category.objects.get_or_create(name=word, defaults={"created_by": author})[0]
+        for word in words[-20:]
+    ]
+    rng = random.Random(42)
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+
+    def text(count):
+        return " ".join(rng.choices(words, cum_weights=weights, k=count))
+
+    start = Post.objects.count()
+    for offset in range(start, posts, batch_size):
+        batch = [
+            Post(
+                title=text(6),
+                excerpt=text(15),
+                content=text(80),
+                slug=f"bench-{i}",
+                author=author,
+                category=rng.choice(categories),
+            )
+            for i in range(offset, min(offset + batch_size, posts))
+        ]
+        Post.objects.bulk_create(batch)
+        print(f"  {offset + len(batch)}/{posts} posts", end="\r", flush=True)
+    if start < posts:
+        print()
+        # bulk_create skips the post_save signals that maintain the index
+        get_backend().rebuild()
+
+
+def time_queries(run, queries, repeat):
+    timings = []
+    for _ in range(repeat):
+        for query in queries:
+            started = time.perf_counter()
+            run(query)
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[max(int(len(timings) * 0.99) - 1, 0)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark post search")
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--db", default="/tmp/blogsphere-search-bench.sqlite3")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ["DB_NAME"] = args.db
+
+    import django
+
+    django.setup()
+    from django.core.management import call_command
+    from api.models import Post
+    from api.search import PostSearch
+
+    words = vocabulary(4000)
+    call_command("migrate", verbosity=0)
+    generate(args.posts, words)
+
+    # Rare, mid-frequency and common terms, a prefix and multi-word queries
+    queries = [
+        words[3500], words[800], words[40], words[5],
+        words[120][:4], f"{words[300]} {words[900]}", f"{words[10]} {words[2000]}",
+    ]
+
+    def ranked(query):
+        search = PostSearch(query)
+        return search.fetch(search.rank(args.page_size))
+
+    def scan(query):
+        return list(
+            Post.objects.filter(title__icontains=query).order_by("-created_at")[
+                : args.page_size
+            ]
+        )
+
+    print(f"{Post.objects.count()} posts, {args.repeat} x {len(queries)} queries")
+    for name, run in (("fts", ranked), ("icontains", scan)):
+        p50, p99 = time_queries(run, queries, args.repeat)
+        print(f"{name:>10}: p50 {p50:8.2f} ms   p99 {p99:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -166,7 +166,7 @@ const AllPosts = () => {
                             <div>
                                 <p className="text-lg text-gray-600">Total Comments</p>
                                 <h3 className="text-4xl font-bold bg-gradient-to-r from-purple-600 to-pink-600 bg-clip-text text-transparent mt-2">
-                                    {posts.reduce((total, post) => total + (post.comments?.length || 0), 0)}
+                                    {posts.reduce((total, post) => total + (post.comment_count || 0), 0)}
                                 </h3>
                             </div>
                             <div className="bg-purple-50 p-4 rounded-xl">
@@ -260,7 +260,7 @@ const AllPosts = () => {
                                         {post.image && (
                                             <div className="md:w-1/3 relative overflow-hidden">
                                                 <img
-                                                    src={BASE_URL.slice(0, BASE_URL.lastIndexOf('api')) + post.image}
+                                                    src={BASE_URL.slice(0, BASE_URL.lastIndexOf('api')) + (post.image_renditions?.card?.webp || post.image)}
                                                     alt={post.title}
                                                     className="w-full h-full object-cover transform group-hover:scale-105 transition-transform duration-300"
                                                 />
@@ -307,7 +307,7 @@ const AllPosts = () => {
                                                         className="flex items-center gap-1 text-sm text-gray-600 hover:text-blue-500 transition-colors duration-200"
                                                     >
                                                         <i className="fas fa-comments"></i>
-                                                        <span>{post.comments?.length || 0}</span>
+                                                        <span>{post.comment_count || 0}</span>
                                                     </Link>
                                                     <Link
                                                         to={`/blog/${post.slug}`}
@@ -10,14 +10,16 @@ const Blog = () => {
   const BASE_URL = import.meta.env.VITE_API_URL; // Your API base URL
 
   const [blogs, setBlogs] = useState([]);
+  const [nextBlogs, setNextBlogs] = useState(null);
   const [recentBlogs, setRecentBlogs] = useState([{ slug: '', title: '' }]);
   const [categories, setCategories] = useState([]);
   const [searchQuery, setSearchQuery] = useState('');
   const [loading, setLoading] = useState(true);
 
-  const fetchPosts = async () => {
+  // One cursor page of posts at a time
+  const fetchPosts = async (url = `${BASE_URL}/posts/`, reset = true) => {
     try {
-      const response = await fetch(`${BASE_URL}/posts/`, {
+      const response = await fetch(url, {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json'
@@ -26,7 +28,8 @@ const Blog = () => {
 
       if (response.ok) {
         const data = await response.json();
-        setBlogs(data);
+        setBlogs((previous) => (reset ? data.results : [...previous, ...data.results]));
+        setNextBlogs(data.next);
         setLoading(false);
       }
     } catch (error) {
@@ -162,6 +165,16 @@ const Blog = () => {
                 </motion.div>
               ))}
             </div>
+            {nextBlogs && (
+              <div className="flex justify-center mt-8">
+                <button
+                  onClick={() => fetchPosts(nextBlogs, false)}
+                  className="px-6 py-2 bg-blue-50 text-blue-600 rounded-xl hover:bg-blue-100 transition-colors duration-200"
+                >
+                  Load more
+                </button>
+              </div>
+            )}
           </motion.div>
 
           {/* Right Column - Sidebar */}
@@ -243,6 +256,7 @@ const Blog = () => {
                       className="px-4 py-2 bg-blue-50 text-blue-600 rounded-xl hover:bg-blue-100 transition-colors duration-200"
                     >
                       {formatCategoryForDisplay(category)}
+                      <span className="ml-2 text-xs text-blue-400">{category.post_count}</span>
                     </motion.button>
                   ))}
                 </div>
@@ -35,6 +35,28 @@ const Category = () => {
         }
     };
 
+    // The category comes with one cursor page of its posts, `next` has the rest
+    const loadMorePosts = async () => {
+        try {
+            const response = await fetch(category.next, {
+                method: 'GET',
+                headers: { 'Content-Type': 'application/json' }
+            });
+            if (!response.ok) {
+                throw new Error('Failed to fetch posts');
+            }
+            const data = await response.json();
+            setCategory((previous) => ({
+                ...previous,
+                posts: [...previous.posts, ...data.posts],
+                next: data.next,
+            }));
+        } catch (error) {
+            console.error('Error fetching posts:', error);
+            toast.error('Error loading posts');
+        }
+    };
+
     useEffect(() => {
         getCategory();
     }, [name]);
@@ -139,6 +161,7 @@ const Category = () => {
                             </div>
 
                             {category.posts && category.posts.length > 0 ? (
+                                <>
                                 <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
                                     {category.posts.map((blog, index) => (
                                         <motion.div
@@ -153,6 +176,17 @@ const Category = () => {
                                         </motion.div>
                                     ))}
                                 </div>
+                                {category.next && (
+                                    <div className="flex justify-center mt-8">
+                                        <button
+                                            onClick={loadMorePosts}
+                                            className="px-6 py-2 bg-blue-50 text-blue-600 rounded-xl hover:bg-blue-100 transition-colors duration-200"
+                                        >
+                                            Load more
+                                        </button>
+                                    </div>
+                                )}
+                                </>
                             ) : (
                                 <motion.div
                                     initial={{ opacity: 0, y: 20 }}
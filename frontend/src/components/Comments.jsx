@@ -12,6 +12,7 @@ const Comments = () => {
     const [sortBy, setSortBy] = useState('newest');
     const navigate = useNavigate();
     const [totalUserComments, setTotalUserComments] = useState(0);
+    const [nextComments, setNextComments] = useState(null);
 
     useEffect(() => {
         fetchData();
@@ -26,15 +27,7 @@ const Comments = () => {
                     setComments(response.data.comments || []);
                 }
             } else {
-                const response = await apiClient.get('/comments/');
-                if (response.status === 200) {
-                    if (Array.isArray(response.data)) {
-                        setComments(response.data);
-                    } else {
-                        setComments(response.data.comments);
-                        setTotalUserComments(response.data.total_user_comments);
-                    }
-                }
+                await fetchComments('/comments/', true);
             }
         } catch (error) {
             console.error('Error fetching data:', error);
@@ -43,6 +36,27 @@ const Comments = () => {
         }
     };
 
+    // One cursor page of the comments on the user's posts at a time
+    const fetchComments = async (url, reset = false) => {
+        const response = await apiClient.get(url);
+        if (response.status === 200) {
+            const page = response.data.results || response.data.comments;
+            setComments((previous) => (reset ? page : [...previous, ...page]));
+            setNextComments(response.data.next);
+            if (response.data.total_user_comments !== undefined) {
+                setTotalUserComments(response.data.total_user_comments);
+            }
+        }
+    };
+
+    const loadMoreComments = async () => {
+        try {
+            await fetchComments(nextComments);
+        } catch (error) {
+            console.error('Error fetching comments:', error);
+        }
+    };
+
     const formatDate = (dateString) => {
         const date = new Date(dateString);
         const now = new Date();
@@ -155,7 +169,7 @@ const Comments = () => {
                             <div>
                                 <h3 className="text-lg font-semibold text-gray-900">Total Comments</h3>
                                 <p className="text-gray-500">
-                                    Showing {filteredComments.length} of {comments.length} comments
+                                    Showing {filteredComments.length} of {Math.max(totalUserComments, comments.length)} comments
                                 </p>
                             </div>
                         </div>
@@ -265,6 +279,16 @@ const Comments = () => {
                                 </motion.div>
                             ))
                         )}
+                        {!slug && nextComments && (
+                            <div className="flex justify-center mt-8">
+                                <button
+                                    onClick={loadMoreComments}
+                                    className="px-6 py-2 bg-blue-50 text-blue-600 rounded-xl hover:bg-blue-100 transition-colors duration-200"
+                                >
+                                    Load more
+                                </button>
+                            </div>
+                        )}
                     </div>
                 )}
             </div>
@@ -8,6 +8,8 @@ const Profile = () => {
     const navigate = useNavigate();
 
     const [author, setAuthor] = useState(null);
+    const [posts, setPosts] = useState([]);
+    const [nextPosts, setNextPosts] = useState(null);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
 
@@ -25,9 +27,10 @@ const Profile = () => {
             }
 
             const data = await response.json();
-            const { first_name, last_name, photo, bio, posts } = data;
+            const { first_name, last_name, photo, bio, post_count, comment_count } = data;
 
-            setAuthor({ first_name, last_name, photo, bio, posts });
+            setAuthor({ first_name, last_name, photo, bio, post_count, comment_count });
+            await getPosts(`${BASE_URL}/users/${username}/posts/`, true);
         } catch (error) {
             setError(error.message);
         } finally {
@@ -35,6 +38,28 @@ const Profile = () => {
         }
     };
 
+    // One cursor page of the author's posts at a time
+    const getPosts = async (url, reset = false) => {
+        const response = await fetch(url, {
+            method: 'GET',
+            headers: { 'Content-Type': 'application/json' },
+        });
+        if (!response.ok) {
+            throw new Error('Failed to fetch posts');
+        }
+        const data = await response.json();
+        setPosts((previous) => (reset ? data.results : [...previous, ...data.results]));
+        setNextPosts(data.next);
+    };
+
+    const loadMorePosts = async () => {
+        try {
+            await getPosts(nextPosts);
+        } catch (error) {
+            setError(error.message);
+        }
+    };
+
     useEffect(() => {
         getAuthor();
     }, [username]);
@@ -154,7 +179,7 @@ const Profile = () => {
                                             whileHover={{ scale: 1.05 }}
                                             className="bg-blue-50 px-6 py-3 rounded-xl"
                                         >
-                                            <p className="text-3xl font-bold text-blue-600 text-center">{author.posts?.length || 0}</p>
+                                            <p className="text-3xl font-bold text-blue-600 text-center">{author.post_count || 0}</p>
                                             <p className="text-sm text-gray-600">Posts</p>
                                         </motion.div>
                                         <motion.div
@@ -162,7 +187,7 @@ const Profile = () => {
                                             className="bg-purple-50 px-6 py-3 rounded-xl"
                                         >
                                             <p className="text-3xl font-bold text-purple-600 text-center">
-                                                {author.posts?.reduce((total, post) => total + (post.comments?.length || 0), 0)}
+                                                {author.comment_count || 0}
                                             </p>
                                             <p className="text-sm text-gray-600">Comments</p>
                                         </motion.div>
@@ -184,14 +209,17 @@ const Profile = () => {
                                 <div className="h-1 flex-1 mx-4 bg-gradient-to-r from-blue-600/20 to-purple-600/20 rounded-full" />
                             </div>
 
-                            {author.posts && author.posts.length > 0 ? (
+                            {posts.length > 0 ? (
+                                <>
                                 <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
-                                    {author.posts.map((blog, index) => {
+                                    {posts.map((blog, index) => {
+                                        // Prefer the resized card image once it is ready
+                                        const image = blog.image_renditions?.card?.webp || blog.image;
                                         const blogWithFullUrl = {
                                             ...blog,
-                                            image: blog.image?.startsWith('http')
-                                                ? blog.image
-                                                : `${BASE_URL.slice(0, BASE_URL.lastIndexOf('api'))}${blog.image}`
+                                            image: image?.startsWith('http')
+                                                ? image
+                                                : `${BASE_URL.slice(0, BASE_URL.lastIndexOf('api'))}${image}`
                                         };
 
                                         return (
@@ -206,6 +234,17 @@ const Profile = () => {
                                         );
                                     })}
                                 </div>
+                                {nextPosts && (
+                                    <div className="flex justify-center mt-8">
+                                        <button
+                                            onClick={loadMorePosts}
+                                            className="px-6 py-2 bg-blue-50 text-blue-600 rounded-xl hover:bg-blue-100 transition-colors duration-200"
+                                        >
+                                            Load more
+                                        </button>
+                                    </div>
+                                )}
+                                </>
                             ) : (
                                 <motion.div
                                     initial={{ opacity: 0, y: 20 }}
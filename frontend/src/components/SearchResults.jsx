@@ -7,6 +7,7 @@ import { formatCategoryForDisplay } from '../utils/formatters';
 const SearchResults = () => {
     const [searchParams] = useSearchParams();
     const [searchResults, setSearchResults] = useState([]);
+    const [nextResults, setNextResults] = useState(null);
     const [loading, setLoading] = useState(true);
     const [recentBlogs, setRecentBlogs] = useState([{ slug: '', title: '' }]);
     const [categories, setCategories] = useState([]);
@@ -22,7 +23,8 @@ const SearchResults = () => {
                 const response = await fetch(`${BASE_URL}/posts/search/?q=${query}`);
                 if (response.ok) {
                     const data = await response.json();
-                    setSearchResults(data);
+                    setSearchResults(data.results);
+                    setNextResults(data.next);
                 }
             } catch (error) {
                 console.error('Error fetching search results:', error);
@@ -36,6 +38,20 @@ const SearchResults = () => {
         }
     }, [query]);
 
+    // Ranked results come one cursor page at a time
+    const loadMoreResults = async () => {
+        try {
+            const response = await fetch(nextResults);
+            if (response.ok) {
+                const data = await response.json();
+                setSearchResults((previous) => [...previous, ...data.results]);
+                setNextResults(data.next);
+            }
+        } catch (error) {
+            console.error('Error fetching search results:', error);
+        }
+    };
+
     const getRecentBlogs = async () => {
         try {
             const response = await fetch(`${BASE_URL}/posts/recent`);
@@ -112,7 +128,7 @@ const SearchResults = () => {
                         transition={{ delay: 0.3 }}
                         className="text-xl text-gray-200"
                     >
-                        Found <span className="font-semibold bg-blue-600/80 px-4 py-1 rounded-xl">{searchResults.length}</span> results
+                        Found <span className="font-semibold bg-blue-600/80 px-4 py-1 rounded-xl">{searchResults.length}{nextResults ? '+' : ''}</span> results
                         for "<span className="font-medium italic">{query}</span>"
                     </motion.p>
                     <motion.nav
@@ -146,6 +162,7 @@ const SearchResults = () => {
                                 <p className="text-gray-500 text-lg font-medium animate-pulse">Searching posts...</p>
                             </div>
                         ) : searchResults.length > 0 ? (
+                            <>
                             <div className="grid grid-cols-1 md:grid-cols-2 gap-8">
                                 {searchResults.map((post) => (
                                     <motion.div
@@ -158,6 +175,17 @@ const SearchResults = () => {
                                     </motion.div>
                                 ))}
                             </div>
+                            {nextResults && (
+                                <div className="flex justify-center mt-8">
+                                    <button
+                                        onClick={loadMoreResults}
+                                        className="px-6 py-2 bg-blue-50 text-blue-600 rounded-xl hover:bg-blue-100 transition-colors duration-200"
+                                    >
+                                        Load more
+                                    </button>
+                                </div>
+                            )}
+                            </>
                         ) : (
                             <motion.div
                                 initial={{ opacity: 0, y: 20 }}